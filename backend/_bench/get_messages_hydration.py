@@ -0,0 +1,106 @@
+'''
+Business: Benchmark get-messages hydration - legacy three queries vs single lateral/json_agg query
+Args: DATABASE_URL pointing at a seeded database; --sizes, --iterations, --rtt-ms
+Returns: prints round-trips and median/p95 latency per page size for both strategies
+'''
+
+import argparse
+import os
+import statistics
+import time
+from typing import Any, Callable, List
+
+import psycopg2
+
+from handlers import load_handler_module
+
+
+def legacy_fetch(cur: Any, limit: int) -> int:
+    cur.execute(f"""
+        SELECT m.id, m.text, m.created_at, u.id, u.username
+        FROM t_p53416936_auxchat_energy_messa.messages m
+        JOIN t_p53416936_auxchat_energy_messa.users u ON m.user_id = u.id
+        ORDER BY m.created_at DESC
+        LIMIT {limit} OFFSET 0
+    """)
+    rows = cur.fetchall()
+    if not rows:
+        return 1
+    message_ids = [row[0] for row in rows]
+    user_ids = list(set([row[3] for row in rows]))
+    cur.execute(f"""
+        SELECT message_id, emoji, COUNT(*) as count
+        FROM t_p53416936_auxchat_energy_messa.message_reactions
+        WHERE message_id IN ({','.join(map(str, message_ids))})
+        GROUP BY message_id, emoji
+    """)
+    cur.fetchall()
+    cur.execute(f"""
+        SELECT DISTINCT ON (user_id) user_id, photo_url
+        FROM t_p53416936_auxchat_energy_messa.user_photos
+        WHERE user_id IN ({','.join(map(str, user_ids))})
+        ORDER BY user_id, display_order ASC, created_at DESC
+    """)
+    cur.fetchall()
+    return 3
+
+
+def single_fetch(cur: Any, limit: int, hydrated_query: str) -> int:
+    page_query = f"""
+        SELECT id, user_id, text, created_at
+        FROM t_p53416936_auxchat_energy_messa.messages
+        ORDER BY created_at DESC, id DESC
+        LIMIT {limit} OFFSET 0
+    """
+    cur.execute(hydrated_query.format(page=page_query))
+    cur.fetchall()
+    return 1
+
+
+def measure(fetch: Callable[[], int], iterations: int, rtt_ms: float) -> tuple:
+    timings: List[float] = []
+    round_trips = 0
+    fetch()
+    for _ in range(iterations):
+        started = time.perf_counter()
+        round_trips = fetch()
+        # Моделируем сетевую задержку до удалённой БД на каждый round-trip
+        time.sleep(round_trips * rtt_ms / 1000)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return round_trips, statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='20,100,500')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--rtt-ms', type=float, default=0.0, help='simulated network round-trip to the DB')
+    args = parser.parse_args()
+    
+    hydrated_query = load_handler_module('get-messages').HYDRATED_MESSAGES_QUERY
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn.autocommit = True
+    cur = conn.cursor()
+    
+    cur.execute('SELECT COUNT(*) FROM t_p53416936_auxchat_energy_messa.messages')
+    total = cur.fetchone()[0]
+    print(f'messages in database: {total}, simulated rtt: {args.rtt_ms} ms')
+    print(f'{"size":>6} {"strategy":>8} {"round-trips":>11} {"p50 ms":>9} {"p95 ms":>9}')
+    
+    for size in [int(s) for s in args.sizes.split(',')]:
+        if total < size:
+            print(f'{size:>6} warning: only {total} messages, page is not full')
+        for name, fetch in (
+            ('legacy', lambda: legacy_fetch(cur, size)),
+            ('single', lambda: single_fetch(cur, size, hydrated_query)),
+        ):
+            round_trips, p50, p95 = measure(fetch, args.iterations, args.rtt_ms)
+            print(f'{size:>6} {name:>8} {round_trips:>11} {p50:>9.2f} {p95:>9.2f}')
+    
+    cur.close()
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
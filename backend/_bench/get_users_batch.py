@@ -0,0 +1,74 @@
+'''
+Business: Benchmark list rendering - a user list with N get-user calls vs one get-users call
+Args: DATABASE_URL pointing at a seeded database; --sizes, --iterations, --request-ms
+Returns: prints HTTP requests and median/p95 latency per list size for both strategies
+'''
+
+import argparse
+import os
+import statistics
+import time
+from typing import Callable, List
+
+import psycopg2
+
+from handlers import load_handler_module
+
+
+def measure(fetch: Callable[[], int], iterations: int, request_ms: float) -> tuple:
+    timings: List[float] = []
+    requests = 0
+    fetch()
+    for _ in range(iterations):
+        started = time.perf_counter()
+        requests = fetch()
+        # Моделируем накладные расходы HTTP-вызова функции (TLS, маршрутизация, холодные старты)
+        time.sleep(requests * request_ms / 1000)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return requests, statistics.median(timings), timings[max(0, int(len(timings) * 0.95) - 1)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='10,50,200')
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--request-ms', type=float, default=0.0, help='simulated overhead of one HTTP function call')
+    args = parser.parse_args()
+    
+    get_user = load_handler_module('get-user')
+    get_users = load_handler_module('get-users')
+    from _common.profiles import get_cache
+    
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    cur.execute('SELECT id FROM t_p53416936_auxchat_energy_messa.users ORDER BY id LIMIT %s', (get_users.MAX_IDS,))
+    all_ids = [row[0] for row in cur.fetchall()]
+    cur.close()
+    conn.close()
+    
+    def fan_out(ids: List[int]) -> int:
+        for user_id in ids:
+            # Каждый вызов — отдельный инстанс без тёплого кеша профилей
+            get_cache().invalidate(user_id)
+            get_user.handler({'httpMethod': 'GET', 'queryStringParameters': {'user_id': str(user_id)}}, None)
+        return len(ids)
+    
+    def batch(ids: List[int]) -> int:
+        get_users.handler({'httpMethod': 'GET', 'queryStringParameters': {'ids': ','.join(map(str, ids))}}, None)
+        return 1
+    
+    print(f'users in database: {len(all_ids)}+, simulated request overhead: {args.request_ms} ms')
+    print(f'{"size":>6} {"strategy":>8} {"requests":>8} {"p50 ms":>9} {"p95 ms":>9}')
+    
+    for size in [int(s) for s in args.sizes.split(',')]:
+        ids = all_ids[:size]
+        if len(ids) < size:
+            print(f'{size:>6} warning: only {len(ids)} users')
+        for name, fetch in (('n-calls', lambda: fan_out(ids)), ('batch', lambda: batch(ids))):
+            requests, p50, p95 = measure(fetch, args.iterations, args.request_ms)
+            print(f'{size:>6} {name:>8} {requests:>8} {p50:>9.2f} {p95:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+'''
+Business: Shared loader for the benchmarks - imports a function's index.py the way the runtime does
+Args: function directory name under backend/ (e.g. 'get-messages')
+Returns: BACKEND_DIR and load_handler_module(name) -> module; importing this puts backend/ on sys.path for _common
+'''
+
+import importlib.util
+import os
+import sys
+from typing import Any
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def load_handler_module(name: str) -> Any:
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), os.path.join(BACKEND_DIR, name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,346 @@
+'''
+Business: Benchmark the whole backend under client-like traffic - polling mixes of Chat, Conversations and Index pages run in-process
+Args: DATABASE_URL pointing at a database filled by _tools/seed.py (handlers write to it); --users, --duration, --concurrency, --speed, --seed, --json, --compare
+Returns: prints requests, 4xx/5xx, p50/p95/p99 latency and queries per request for every endpoint; --json saves the numbers
+         and --compare puts an earlier run next to them for before/after checks
+'''
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+from handlers import BACKEND_DIR, load_handler_module
+
+
+# Обращаются к ЮKassa и S3 - в локальном прогоне им нечего мерить
+EXTERNAL = {'create-payment', 'generate-upload-url'}
+
+# Интервалы опроса фронтенда в секундах: Chat.tsx, Conversations.tsx, Index.tsx
+MIXES: Dict[str, List[Tuple[str, float]]] = {
+    'chat': [('thread_poll', 3), ('profile', 10), ('activity', 60), ('send_private', 20)],
+    'conversations': [('conversations', 5), ('activity', 60)],
+    'feed': [('feed_poll', 5), ('activity', 60), ('send_message', 30), ('react', 15)],
+}
+MIX_WEIGHTS = {'chat': 0.5, 'conversations': 0.2, 'feed': 0.3}
+
+_local = threading.local()
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    '''Counts statements per request; each worker thread serves one request at a time'''
+    def execute(self, query: Any, vars: Any = None) -> Any:
+        _local.queries = getattr(_local, 'queries', 0) + 1
+        return super().execute(query, vars)
+
+    def executemany(self, query: Any, vars_list: Any) -> Any:
+        _local.queries = getattr(_local, 'queries', 0) + 1
+        return super().executemany(query, vars_list)
+
+
+def percentile(values: List[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(len(ordered) * share)) - 1))]
+
+
+class VirtualUser:
+    '''One open browser tab: a user, the partner of the open chat and the state the page keeps between polls'''
+
+    def __init__(self, number: int, user_id: int, phone: str, other_id: int) -> None:
+        self.user_id = user_id
+        self.phone = phone
+        self.other_id = other_id
+        self.since_id = 0
+        self.ip = f'10.{number // 65536 % 256}.{number // 256 % 256}.{number % 256}'
+        self.lock = threading.Lock()
+
+    def headers(self) -> Dict[str, str]:
+        return {'X-User-Id': str(self.user_id), 'X-Forwarded-For': self.ip}
+
+
+class Traffic:
+    '''Builds the handler calls; every action returns [(endpoint, method, query, body, headers), ...]'''
+
+    def __init__(self, rng: random.Random, sample: Dict[str, Any]) -> None:
+        self.rng = rng
+        self.sample = sample
+        self.serial = itertools.count(int(time.time()) % 1000000 * 1000)
+
+    def other_users(self, k: int) -> str:
+        return ','.join(str(u) for u in self.rng.sample(self.sample['user_ids'], k))
+
+    def thread_poll(self, vu: VirtualUser) -> List[tuple]:
+        query = {'otherUserId': str(vu.other_id), 'sinceId': str(vu.since_id)}
+        return [('private-messages', 'GET', query, None, vu.headers())]
+
+    def profile(self, vu: VirtualUser) -> List[tuple]:
+        return [
+            ('get-user', 'GET', {'user_id': str(vu.other_id)}, None, {}),
+            ('profile-photos', 'GET', {'userId': str(vu.other_id)}, None, vu.headers()),
+        ]
+
+    def activity(self, vu: VirtualUser) -> List[tuple]:
+        return [('update-activity', 'POST', None, {}, vu.headers())]
+
+    def send_private(self, vu: VirtualUser) -> List[tuple]:
+        return [('private-messages', 'POST', None, {'receiverId': vu.other_id, 'text': 'нагрузка'}, vu.headers())]
+
+    def conversations(self, vu: VirtualUser) -> List[tuple]:
+        return [('get-conversations', 'GET', {}, None, vu.headers())]
+
+    def feed_poll(self, vu: VirtualUser) -> List[tuple]:
+        return [('get-messages', 'GET', {'limit': '20', 'offset': '0'}, None, {})]
+
+    def send_message(self, vu: VirtualUser) -> List[tuple]:
+        return [('send-message', 'POST', None, {'user_id': vu.user_id, 'text': 'нагрузка'}, vu.headers())]
+
+    def react(self, vu: VirtualUser) -> List[tuple]:
+        body = {'user_id': vu.user_id, 'message_id': self.rng.choice(self.sample['message_ids']), 'emoji': '👍'}
+        return [('add-reaction', 'POST', None, body, vu.headers())]
+
+    def misc(self, vu: VirtualUser) -> List[List[tuple]]:
+        '''Rare calls, one of each per cycle so every handler shows up in the report'''
+        n = next(self.serial)
+        new_phone = f'+7991{n % 10000000:07d}'
+        admin = os.environ.get('ADMIN_SECRET', '')
+        return [
+            [('login', 'POST', None, {'phone': vu.phone, 'password': 'password'}, vu.headers())],
+            [('register', 'POST', None, {'phone': new_phone, 'username': f'load{n}', 'password': 'password'}, vu.headers())],
+            [('send-sms', 'POST', None, {'phone': new_phone}, vu.headers())],
+            [('verify-sms', 'POST', None, {'phone': new_phone, 'code': '000000'}, vu.headers())],
+            [('reset-password', 'POST', None, {'phone': vu.phone, 'new_password': 'password'}, vu.headers())],
+            [('create-user', 'POST', None, {'phone': f'+7992{n % 10000000:07d}', 'username': f'load{n}'}, {})],
+            [('get-users', 'GET', {'ids': self.other_users(20)}, None, {})],
+            [('presence', 'GET', {'ids': self.other_users(50)}, None, {})],
+            [('get-feed', 'GET', {'limit': '20'}, None, {'X-User-Id': str(self.sample['follower'])})],
+            [('get-subscriptions', 'GET', {}, None, vu.headers())],
+            [('subscribe', 'POST', None, {'targetUserId': vu.other_id}, vu.headers()),
+             ('subscribe', 'GET', {'targetUserId': str(vu.other_id)}, None, vu.headers()),
+             ('subscribe', 'DELETE', {'targetUserId': str(vu.other_id)}, None, vu.headers())],
+            [('blacklist', 'GET', {}, None, vu.headers())],
+            [('add-energy', 'POST', None, {'user_id': vu.user_id, 'amount': 10}, {})],
+            [('payment-webhook', 'POST', None, {'event': 'payment.succeeded', 'object': {
+                'id': f'load-{n}', 'metadata': {'user_id': str(vu.user_id), 'energy_amount': '10'}}}, {})],
+            [('admin-users', 'GET', {}, None, {}),
+             ('admin-users', 'POST', None, {'action': 'add_energy', 'target_user_id': vu.user_id,
+                                            'amount': 1, 'admin_secret': admin}, {})],
+            [('wait-messages', 'GET', {'sinceId': str(vu.since_id), 'timeout': '1'}, None, vu.headers())],
+            [('sms-worker', 'POST', None, {}, {})],
+            [('get-messages', 'GET', {'limit': '20', 'before': self.sample['cursor']}, None, {})],
+            [('add-reaction', 'POST', None, {'user_id': vu.user_id, 'toggles': [
+                {'message_id': m, 'emoji': '❤️'} for m in self.rng.sample(self.sample['message_ids'], 5)]}, {})],
+        ]
+
+
+def sample(cur: Any, users: int, rng: random.Random) -> Optional[Dict[str, Any]]:
+    '''Real ids to aim the traffic at: busy conversation pairs, recent messages, the top follower'''
+    cur.execute("""
+        SELECT c.user_low, c.user_high, u.phone
+        FROM t_p53416936_auxchat_energy_messa.conversations c
+        JOIN t_p53416936_auxchat_energy_messa.users u ON u.id = c.user_low
+        WHERE NOT EXISTS (
+            SELECT 1 FROM t_p53416936_auxchat_energy_messa.blacklist b
+            WHERE (b.user_id = c.user_low AND b.blocked_user_id = c.user_high)
+               OR (b.user_id = c.user_high AND b.blocked_user_id = c.user_low)
+        )
+        ORDER BY c.last_message_at DESC LIMIT %s
+    """, (users,))
+    pairs = cur.fetchall()
+    cur.execute('SELECT id FROM t_p53416936_auxchat_energy_messa.messages ORDER BY id DESC LIMIT 500')
+    message_ids = [row[0] for row in cur.fetchall()]
+    cur.execute('SELECT id FROM t_p53416936_auxchat_energy_messa.users ORDER BY id DESC LIMIT 2000')
+    user_ids = [row[0] for row in cur.fetchall()]
+    cur.execute("""
+        SELECT subscriber_id FROM t_p53416936_auxchat_energy_messa.subscriptions
+        GROUP BY 1 ORDER BY COUNT(*) DESC LIMIT 1
+    """)
+    follower = cur.fetchone()
+    cur.execute("""
+        SELECT created_at, id FROM t_p53416936_auxchat_energy_messa.messages
+        ORDER BY created_at DESC, id DESC OFFSET 20 LIMIT 1
+    """)
+    cursor = cur.fetchone()
+    if not pairs or len(message_ids) < 5 or len(user_ids) < 50 or not follower or not cursor:
+        return None
+    
+    from _common.messages import encode_cursor
+    
+    vus = []
+    for number in range(users):
+        low, high, phone = pairs[number % len(pairs)]
+        vus.append(VirtualUser(number, low, phone, high))
+    rng.shuffle(vus)
+    return {
+        'vus': vus, 'message_ids': message_ids, 'user_ids': user_ids,
+        'follower': follower[0], 'cursor': encode_cursor(cursor[0], cursor[1])
+    }
+
+
+def schedule(rng: random.Random, vus: List[VirtualUser], duration: float, misc_rate: float,
+             misc_kinds: int) -> List[Tuple[float, VirtualUser, str]]:
+    '''(second, user, action) for the whole run; each tab starts at a random phase like real page loads'''
+    events = []
+    for vu in vus:
+        mix = rng.choices(list(MIX_WEIGHTS), weights=list(MIX_WEIGHTS.values()))[0]
+        for action, interval in MIXES[mix]:
+            at = rng.uniform(0, interval)
+            while at < duration:
+                events.append((at, vu, action))
+                at += interval * rng.uniform(0.9, 1.1)
+    misc_count = max(int(duration * misc_rate), misc_kinds)
+    for index in range(misc_count):
+        events.append((rng.uniform(0, duration), rng.choice(vus), f'misc:{index}'))
+    events.sort(key=lambda event: event[0])
+    return events
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=200, help='simultaneously open tabs')
+    parser.add_argument('--duration', type=float, default=120, help='simulated seconds of traffic')
+    parser.add_argument('--concurrency', type=int, default=8, help='worker threads, i.e. warm function instances')
+    parser.add_argument('--speed', type=float, default=1.0, help='time compression; 0 sends the schedule as fast as possible')
+    parser.add_argument('--misc-rate', type=float, default=0.5, help='rare calls (login, register, payments...) per second')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='save results to this file')
+    parser.add_argument('--compare', help='results file of an earlier run to print next to this one')
+    args = parser.parse_args()
+    
+    os.environ.setdefault('SMS_PROVIDER', 'fake')
+    os.environ.setdefault('ADMIN_SECRET', 'load-test')
+    
+    from _common import db
+    
+    url = os.environ['DATABASE_URL']
+    db._connect = lambda: psycopg2.connect(url, cursor_factory=CountingCursor)
+    db.MAX_IDLE = max(db.MAX_IDLE, args.concurrency)
+    
+    rng = random.Random(args.seed)
+    conn = psycopg2.connect(url)
+    cur = conn.cursor()
+    data = sample(cur, args.users, rng)
+    cur.close()
+    conn.close()
+    if not data:
+        print('database needs users, messages, conversations and subscriptions - run _tools/seed.py first')
+        sys.exit(2)
+    
+    names = sorted(
+        entry for entry in os.listdir(BACKEND_DIR)
+        if not entry.startswith('_') and os.path.isfile(os.path.join(BACKEND_DIR, entry, 'index.py'))
+    )
+    handlers: Dict[str, Callable] = {name: load_handler_module(name).handler for name in names if name not in EXTERNAL}
+    
+    traffic = Traffic(random.Random(args.seed + 1), data)
+    events = schedule(rng, data['vus'], args.duration, args.misc_rate, len(traffic.misc(data['vus'][0])))
+    stats: Dict[str, Dict[str, list]] = {}
+    stats_lock = threading.Lock()
+
+    def record(endpoint: str, status: int, ms: float, queries: int) -> None:
+        with stats_lock:
+            entry = stats.setdefault(endpoint, {'ms': [], 'queries': [], 'status': []})
+            entry['ms'].append(ms)
+            entry['queries'].append(queries)
+            entry['status'].append(status)
+
+    def run(vu: VirtualUser, action: str) -> None:
+        if action.startswith('misc:'):
+            cycle = traffic.misc(vu)
+            calls = cycle[int(action[5:]) % len(cycle)]
+        else:
+            calls = getattr(traffic, action)(vu)
+        # Вкладка шлёт запросы по очереди: следующий опрос ждёт ответа на предыдущий
+        with vu.lock:
+            for endpoint, method, query, body, headers in calls:
+                event = {'httpMethod': method, 'headers': headers, 'queryStringParameters': query}
+                if body is not None:
+                    event['body'] = json.dumps(body)
+                _local.queries = 0
+                started = time.perf_counter()
+                try:
+                    response = handlers[endpoint](event, None)
+                    status = response.get('statusCode', 500)
+                except Exception as e:
+                    print(f'{endpoint} {method} raised {type(e).__name__}: {e}', file=sys.stderr)
+                    response, status = {}, 599
+                ms = (time.perf_counter() - started) * 1000
+                record(f'{endpoint} {method}', status, ms, _local.queries)
+                if action == 'thread_poll' and status == 200:
+                    messages = json.loads(response['body']).get('messages') or []
+                    if messages:
+                        vu.since_id = max(vu.since_id, max(m['id'] for m in messages))
+    
+    print(f'{len(events)} requests over {args.duration:.0f} simulated s: {args.users} tabs, '
+          f'{args.concurrency} workers, speed {args.speed or "unpaced"}')
+    started = time.perf_counter()
+    # Отладочный вывод обработчиков заглушён, иначе он тонет в отчёте
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+            ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for at, vu, action in events:
+            if args.speed:
+                delay = at / args.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(run, vu, action)
+    elapsed = time.perf_counter() - started
+    
+    results: Dict[str, Dict[str, float]] = {}
+    for endpoint, entry in sorted(stats.items()):
+        results[endpoint] = {
+            'n': len(entry['ms']),
+            '4xx': sum(1 for s in entry['status'] if 400 <= s < 500),
+            '5xx': sum(1 for s in entry['status'] if s >= 500),
+            'p50': percentile(entry['ms'], 0.50),
+            'p95': percentile(entry['ms'], 0.95),
+            'p99': percentile(entry['ms'], 0.99),
+            'queries': sum(entry['queries']) / len(entry['queries']),
+        }
+    all_ms = [ms for entry in stats.values() for ms in entry['ms']]
+    all_queries = [q for entry in stats.values() for q in entry['queries']]
+    results['TOTAL'] = {
+        'n': len(all_ms),
+        '4xx': sum(r['4xx'] for r in results.values()),
+        '5xx': sum(r['5xx'] for r in results.values()),
+        'p50': percentile(all_ms, 0.50),
+        'p95': percentile(all_ms, 0.95),
+        'p99': percentile(all_ms, 0.99),
+        'queries': sum(all_queries) / len(all_queries),
+    }
+    
+    before = {}
+    if args.compare:
+        with open(args.compare) as f:
+            before = json.load(f)['endpoints']
+    
+    print(f'{"endpoint":>24} {"n":>6} {"4xx":>5} {"5xx":>5} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"q/req":>6}')
+    for endpoint, r in results.items():
+        print(f'{endpoint:>24} {r["n"]:>6} {r["4xx"]:>5} {r["5xx"]:>5} '
+              f'{r["p50"]:>8.2f} {r["p95"]:>8.2f} {r["p99"]:>8.2f} {r["queries"]:>6.1f}')
+        if endpoint in before:
+            b = before[endpoint]
+            print(f'{"before":>24} {b["n"]:>6} {b["4xx"]:>5} {b["5xx"]:>5} '
+                  f'{b["p50"]:>8.2f} {b["p95"]:>8.2f} {b["p99"]:>8.2f} {b["queries"]:>6.1f}')
+    print(f'\n{len(all_ms) / elapsed:.1f} req/s over {elapsed:.1f} s wall clock')
+    
+    exercised = {endpoint.split(' ')[0] for endpoint in stats}
+    skipped = [name for name in names if name not in exercised]
+    if skipped:
+        print(f'not exercised: {", ".join(skipped)}' + (' (external APIs)' if set(skipped) <= EXTERNAL else ''))
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'req_per_s': len(all_ms) / elapsed, 'endpoints': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+'''
+Business: Pick the scrypt cost for _common/passwords.py - the highest cost whose verification stays under a latency target
+Args: --target-ms (p99 budget per verification), --min-log-n, --max-log-n, --r, --p, --iterations
+Returns: prints median/p99 verification latency per cost and the PASSWORD_SCRYPT_* settings to deploy
+'''
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from _common.passwords import hash_password, verify_password
+
+
+def p99(samples: list) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--target-ms', type=float, default=100.0)
+    parser.add_argument('--min-log-n', type=int, default=12)
+    parser.add_argument('--max-log-n', type=int, default=18)
+    parser.add_argument('--r', type=int, default=8)
+    parser.add_argument('--p', type=int, default=1)
+    parser.add_argument('--iterations', type=int, default=30)
+    args = parser.parse_args()
+    
+    chosen = None
+    for log_n in range(args.min_log_n, args.max_log_n + 1):
+        stored = hash_password('benchmark-password', log_n=log_n, r=args.r, p=args.p)
+        samples = []
+        for _ in range(args.iterations):
+            started = time.perf_counter()
+            verify_password('benchmark-password', stored)
+            samples.append((time.perf_counter() - started) * 1000)
+        memory_mb = 128 * (1 << log_n) * args.r * args.p / (1024 * 1024)
+        print(f'ln={log_n:<3} r={args.r} p={args.p} mem={memory_mb:>6.0f}MB  '
+              f'median {statistics.median(samples):7.1f}ms  p99 {p99(samples):7.1f}ms')
+        if p99(samples) > args.target_ms:
+            break
+        chosen = log_n
+    
+    if chosen is None:
+        print(f'No cost in range fits {args.target_ms}ms; lower --min-log-n')
+        sys.exit(1)
+    print(f'PASSWORD_SCRYPT_LOG_N={chosen} PASSWORD_SCRYPT_R={args.r} PASSWORD_SCRYPT_P={args.p}')
+
+
+if __name__ == '__main__':
+    main()
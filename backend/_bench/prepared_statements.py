@@ -0,0 +1,118 @@
+'''
+Business: Benchmark planning cost of the polling queries - plain parameterized SQL vs server-side prepared statements
+Args: DATABASE_URL pointing at a seeded database; --iterations
+Returns: prints planning time per call (from EXPLAIN ANALYZE) and median/p95 latency per statement for both modes
+'''
+
+import argparse
+import os
+import re
+import statistics
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+import psycopg2
+
+from handlers import load_handler_module
+
+PLANNING_TIME = re.compile(r'Planning Time: ([\d.]+) ms')
+
+
+def measure(fetch: Callable[[], Any], iterations: int) -> tuple:
+    timings: List[float] = []
+    fetch()
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fetch()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[max(0, int(len(timings) * 0.95) - 1)]
+
+
+def planning_ms(cur: Any, sql: str, params: Any) -> float:
+    cur.execute(f'EXPLAIN (ANALYZE, SUMMARY) {sql}', params)
+    plan = '\n'.join(row[0] for row in cur.fetchall())
+    match = PLANNING_TIME.search(plan)
+    return float(match.group(1)) if match else 0.0
+
+
+def sample_params(cur: Any) -> Optional[dict]:
+    cur.execute("""
+        SELECT LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id)
+        FROM t_p53416936_auxchat_energy_messa.private_messages
+        GROUP BY 1, 2 ORDER BY COUNT(*) DESC LIMIT 1
+    """)
+    pair = cur.fetchone()
+    cur.execute("""
+        SELECT created_at, id FROM t_p53416936_auxchat_energy_messa.messages
+        ORDER BY created_at DESC, id DESC OFFSET 20 LIMIT 1
+    """)
+    cursor = cur.fetchone()
+    cur.execute('SELECT MIN(id) FROM t_p53416936_auxchat_energy_messa.users')
+    user_id = cur.fetchone()[0]
+    if not pair or not cursor or user_id is None:
+        return None
+    return {'pair': pair, 'cursor': cursor, 'user_id': user_id}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+    
+    private_messages = load_handler_module('private-messages')
+    get_messages = load_handler_module('get-messages')
+    from _common import queries
+    from _common.profiles import PROFILE_QUERY
+    
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn.autocommit = True
+    cur = conn.cursor()
+    
+    sample = sample_params(cur)
+    if not sample:
+        print('database needs users, messages and private messages - seed it first')
+        return
+    
+    (low, high), (created_at, message_id), user_id = sample['pair'], sample['cursor'], sample['user_id']
+    cases: List[Tuple[queries.Statement, tuple]] = [
+        (private_messages.THREAD_SINCE, (low, high, 0)),
+        (private_messages.THREAD, (low, high)),
+        (get_messages.page_statement('before', 20), (created_at, message_id)),
+        (get_messages.page_statement('offset', 20), (0,)),
+        (PROFILE_QUERY, (user_id,)),
+    ]
+    
+    print(f'iterations: {args.iterations}; planning time is the median of EXPLAIN ANALYZE runs')
+    print(f'{"statement":>24} {"mode":>8} {"plan ms":>8} {"p50 ms":>8} {"p95 ms":>8}')
+    
+    for stmt, params in cases:
+        sql, named = queries.render(stmt, params)
+        plain_plan = statistics.median(planning_ms(cur, sql, named) for _ in range(20))
+        p50, p95 = measure(lambda: (cur.execute(sql, named), cur.fetchall()), args.iterations)
+        print(f'{stmt.name:>24} {"plain":>8} {plain_plan:>8.3f} {p50:>8.3f} {p95:>8.3f}')
+    
+        # Первые пять EXECUTE планируются заново; дальше Postgres переходит на кешированный generic-план
+        for _ in range(10):
+            queries.execute(cur, stmt, params)
+            cur.fetchall()
+        execute_sql = f"EXECUTE {stmt.name} ({', '.join(['%s'] * len(params))})"
+        prepared_plan = statistics.median(planning_ms(cur, execute_sql, params) for _ in range(20))
+        p50, p95 = measure(lambda: (queries.execute(cur, stmt, params), cur.fetchall()), args.iterations)
+        print(f'{stmt.name:>24} {"prepared":>8} {prepared_plan:>8.3f} {p50:>8.3f} {p95:>8.3f}')
+    
+        cur.execute('SELECT generic_plans, custom_plans FROM pg_prepared_statements WHERE name = %s', (stmt.name,))
+        generic, custom = cur.fetchone()
+        # Без generic-планов каждый EXECUTE планируется заново, и разница в планировании - шум
+        if generic:
+            outcome = f'saved {plain_plan - prepared_plan:.3f} ms planning per call'
+        else:
+            outcome = 'no planning win, re-planned on every EXECUTE'
+        print(f'{"":>24} {outcome}; generic plans {generic}, custom plans {custom}')
+    
+    cur.close()
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+'''
+Business: Concurrency check for send-message energy debit - parallel sends must never overspend
+Args: DATABASE_URL pointing at a disposable database; --energy, --senders
+Returns: prints accepted/rejected/rate-limited sends and final balance, exits non-zero if energy went negative
+         or the ledger balance disagrees with users.energy after materialization
+'''
+
+import argparse
+import json
+import os
+import sys
+import threading
+
+import psycopg2
+
+from handlers import load_handler_module
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--energy', type=int, default=55)
+    parser.add_argument('--senders', type=int, default=40)
+    args = parser.parse_args()
+    
+    send_message = load_handler_module('send-message')
+    cost = send_message.MESSAGE_COST
+    
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO t_p53416936_auxchat_energy_messa.users (phone, username, energy)
+        VALUES ('+70000000000' || floor(random() * 100000)::text, 'race-check', %s)
+        RETURNING id
+        """,
+        (args.energy,)
+    )
+    user_id = cur.fetchone()[0]
+    
+    statuses = []
+    barrier = threading.Barrier(args.senders)
+    
+    def send(n: int) -> None:
+        barrier.wait()
+        response = send_message.handler(
+            {'httpMethod': 'POST', 'body': json.dumps({'user_id': user_id, 'text': f'race {n}'})},
+            None
+        )
+        statuses.append(response['statusCode'])
+    
+    threads = [threading.Thread(target=send, args=(n,)) for n in range(args.senders)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    from _common.energy import current_balance, materialize
+    energy = current_balance(cur, user_id)
+    materialize(conn)
+    cur.execute('SELECT energy FROM t_p53416936_auxchat_energy_messa.users WHERE id = %s', (user_id,))
+    materialized = cur.fetchone()[0]
+    cur.execute('SELECT COUNT(*) FROM t_p53416936_auxchat_energy_messa.messages WHERE user_id = %s', (user_id,))
+    inserted = cur.fetchone()[0]
+    cur.close()
+    conn.close()
+    
+    accepted = statuses.count(200)
+    # Отбитые лимитером (send-message:user) до списания не доходят и в проверку атомарности не входят
+    throttled = statuses.count(429)
+    expected = min(args.senders - throttled, args.energy // cost)
+    print(f'user {user_id}: {accepted} sent, {statuses.count(402)} rejected, {throttled} rate-limited, '
+          f'{inserted} rows, energy {args.energy} -> {energy}')
+    
+    if energy < 0 or accepted != expected or inserted != accepted or energy != args.energy - accepted * cost:
+        print('FAIL: energy debit is not atomic')
+        sys.exit(1)
+    if materialized != energy:
+        print(f'FAIL: materialized balance {materialized} != ledger balance {energy}')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+'''
+Business: Stateless HMAC-signed session tokens - issued by login/verify-sms, verified in-process by handlers
+Args: SESSION_SECRET, SESSION_TTL, AUTH_ACCEPT_USER_ID_HEADER from environment; event headers
+Returns: issue_token() -> "uid.admin.banned.expires.signature", authenticate(event) -> Session or None
+'''
+
+import base64
+import hashlib
+import hmac
+import os
+import time
+from typing import Any, Dict, NamedTuple, Optional
+
+SECRET = os.environ.get('SESSION_SECRET', '').encode()
+TTL = int(os.environ.get('SESSION_TTL', str(7 * 24 * 3600)))
+
+# Переходный режим: пока фронтенд не присылает токен, доверяем X-User-Id как раньше
+ACCEPT_USER_ID_HEADER = os.environ.get('AUTH_ACCEPT_USER_ID_HEADER', '1') == '1'
+
+TOKEN_HEADER = 'X-Session-Token'
+ALLOW_HEADERS = 'Content-Type, X-User-Id, X-Session-Token, Authorization'
+
+
+class Session(NamedTuple):
+    user_id: int
+    is_admin: bool
+    is_banned: bool
+    expires_at: int
+    signed: bool
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(SECRET, payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode('ascii').rstrip('=')
+
+
+def _header(headers: Dict[str, Any], name: str) -> Optional[str]:
+    lowered = name.lower()
+    for key, value in headers.items():
+        if key.lower() == lowered:
+            return value
+    return None
+
+
+def issue_token(user_id: int, is_admin: bool = False, is_banned: bool = False, ttl: int = TTL) -> Optional[str]:
+    '''Returns None when SESSION_SECRET is not configured'''
+    if not SECRET:
+        return None
+    payload = f'{int(user_id)}.{int(bool(is_admin))}.{int(bool(is_banned))}.{int(time.time()) + ttl}'
+    return f'{payload}.{_sign(payload)}'
+
+
+def verify_token(token: str) -> Optional[Session]:
+    if not SECRET:
+        return None
+    payload, _, signature = token.rpartition('.')
+    if not payload or not hmac.compare_digest(_sign(payload), signature):
+        return None
+    try:
+        user_id, is_admin, is_banned, expires_at = (int(part) for part in payload.split('.'))
+    except ValueError:
+        return None
+    if expires_at < time.time():
+        return None
+    return Session(user_id, is_admin == 1, is_banned == 1, expires_at, True)
+
+
+def token_from(event: Dict[str, Any]) -> Optional[str]:
+    '''Token the client presented in X-Session-Token or Authorization: Bearer, valid or not'''
+    headers = event.get('headers') or {}
+    token = _header(headers, TOKEN_HEADER)
+    if not token:
+        authorization = _header(headers, 'Authorization') or ''
+        if authorization.startswith('Bearer '):
+            token = authorization[len('Bearer '):]
+    return token.strip() if token else None
+
+
+def authenticate(event: Dict[str, Any]) -> Optional[Session]:
+    '''Session from X-Session-Token / Authorization: Bearer, or from X-User-Id in transitional mode'''
+    headers = event.get('headers') or {}
+    token = token_from(event)
+    if token:
+        # Предъявленный, но невалидный токен не откатывается на X-User-Id
+        return verify_token(token)
+    
+    if not ACCEPT_USER_ID_HEADER:
+        return None
+    user_id = _header(headers, 'X-User-Id')
+    if not user_id or not user_id.strip().isdigit():
+        return None
+    return Session(int(user_id), False, False, 0, False)
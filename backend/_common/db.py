@@ -0,0 +1,77 @@
+'''
+Business: Warm PostgreSQL connection pool shared by all backend functions
+Args: DATABASE_URL, DB_POOL_MAX_IDLE, DB_POOL_PING_AFTER from environment
+Returns: get_conn() / put_conn(conn) to check connections out and back in, connect_dedicated() outside the pool
+'''
+
+import os
+import threading
+import time
+import psycopg2
+import psycopg2.extensions
+from typing import Any, List, Tuple
+
+# Соединения живут на уровне модуля и переживают тёплые вызовы функции
+_idle: List[Tuple[Any, float]] = []
+_lock = threading.Lock()
+
+MAX_IDLE = int(os.environ.get('DB_POOL_MAX_IDLE', '4'))
+PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', '30'))
+
+
+def _connect() -> Any:
+    return psycopg2.connect(os.environ.get('DATABASE_URL'))
+
+
+def connect_dedicated() -> Any:
+    '''Open a connection that never enters the pool, for sessions held open for long (LISTEN)'''
+    return _connect()
+
+
+def _is_alive(conn: Any, idle_since: float) -> bool:
+    if conn.closed:
+        return False
+    if time.monotonic() - idle_since < PING_AFTER:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def get_conn() -> Any:
+    '''Check out a healthy connection, reconnecting if the pooled one went stale'''
+    while True:
+        with _lock:
+            if not _idle:
+                break
+            conn, idle_since = _idle.pop()
+        if _is_alive(conn, idle_since):
+            return conn
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+    return _connect()
+
+
+def put_conn(conn: Any) -> None:
+    '''Return a connection to the pool, discarding it if broken or the pool is full'''
+    if conn.closed:
+        return
+    try:
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+        if conn.autocommit:
+            conn.autocommit = False
+    except psycopg2.Error:
+        conn.close()
+        return
+    with _lock:
+        if len(_idle) < MAX_IDLE:
+            _idle.append((conn, time.monotonic()))
+            return
+    conn.close()
@@ -0,0 +1,97 @@
+'''
+Business: Append-only energy ledger with batched balance materialization
+Args: cursor/connection from _common.db; ENERGY_MATERIALIZE_INTERVAL, ENERGY_MATERIALIZE_BATCH from environment
+Returns: credit()/debit_lock() for writes, current_balance() and BALANCE_SQL for reads, materialize_if_due()
+'''
+
+import os
+import time
+from typing import Any, Optional
+
+MATERIALIZE_INTERVAL = float(os.environ.get('ENERGY_MATERIALIZE_INTERVAL', '60'))
+MATERIALIZE_BATCH = int(os.environ.get('ENERGY_MATERIALIZE_BATCH', '5000'))
+
+# Пространство ключей advisory-lock для сериализации списаний одного пользователя
+DEBIT_LOCK_NAMESPACE = 1001
+
+# Баланс пользователя с алиасом u: материализованная часть плюс ещё не свёрнутые записи журнала
+BALANCE_SQL = """(u.energy + COALESCE((
+    SELECT SUM(l.amount) FROM t_p53416936_auxchat_energy_messa.energy_ledger l
+    WHERE l.user_id = u.id AND l.materialized = FALSE
+), 0))"""
+
+_last_materialize = time.monotonic()
+
+
+def credit(cur: Any, user_id: int, amount: int, reason: str, reference: Optional[str] = None) -> None:
+    '''Append a ledger entry; the users row is not touched until materialization'''
+    cur.execute(
+        """
+        INSERT INTO t_p53416936_auxchat_energy_messa.energy_ledger (user_id, amount, reason, reference)
+        VALUES (%s, %s, %s, %s)
+        """,
+        (user_id, amount, reason, reference)
+    )
+
+
+def record_opening_balance(cur: Any, user_id: int) -> None:
+    '''Log the default signup energy of a freshly inserted user as already materialized'''
+    cur.execute(
+        """
+        INSERT INTO t_p53416936_auxchat_energy_messa.energy_ledger (user_id, amount, reason, materialized)
+        SELECT id, energy, 'signup', TRUE FROM t_p53416936_auxchat_energy_messa.users WHERE id = %s
+        """,
+        (user_id,)
+    )
+
+
+def debit_lock_sql() -> str:
+    '''Statement that serializes balance checks of one user; the next statement sees a fresh snapshot'''
+    return f'SELECT pg_advisory_xact_lock({DEBIT_LOCK_NAMESPACE}, %s);'
+
+
+def current_balance(cur: Any, user_id: int) -> Optional[int]:
+    cur.execute(
+        f"SELECT {BALANCE_SQL} FROM t_p53416936_auxchat_energy_messa.users u WHERE u.id = %s",
+        (user_id,)
+    )
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def materialize(conn: Any, batch_size: int = MATERIALIZE_BATCH) -> int:
+    '''Fold a batch of pending ledger entries into users.energy in one transaction'''
+    cur = conn.cursor()
+    cur.execute(
+        """
+        WITH moved AS (
+            UPDATE t_p53416936_auxchat_energy_messa.energy_ledger
+            SET materialized = TRUE
+            WHERE id IN (
+                SELECT id FROM t_p53416936_auxchat_energy_messa.energy_ledger
+                WHERE materialized = FALSE
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING user_id, amount
+        )
+        UPDATE t_p53416936_auxchat_energy_messa.users u
+        SET energy = u.energy + m.total
+        FROM (SELECT user_id, SUM(amount) AS total FROM moved GROUP BY user_id) m
+        WHERE u.id = m.user_id
+        """,
+        (batch_size,)
+    )
+    updated = cur.rowcount
+    conn.commit()
+    cur.close()
+    return updated
+
+
+def materialize_if_due(conn: Any) -> int:
+    global _last_materialize
+    if time.monotonic() - _last_materialize < MATERIALIZE_INTERVAL:
+        return 0
+    _last_materialize = time.monotonic()
+    return materialize(conn)
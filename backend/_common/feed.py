@@ -0,0 +1,160 @@
+'''
+Business: Followed-users feed - pull from subscriptions + messages, or read a fan-out-on-write inbox
+Args: cursor from _common.db; FEED_FANOUT_ON_WRITE, FEED_INBOX_THRESHOLD, FEED_BACKFILL from environment
+Returns: page_query() for get-feed, fan_out()/backfill()/drop_author() for writers,
+         backfill_subscriber() for _tools/backfill_feed_inbox.py
+'''
+
+import os
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+FANOUT_ON_WRITE = os.environ.get('FEED_FANOUT_ON_WRITE') == '1'
+# С какого числа подписок лента читается из inbox, а не собирается по авторам
+INBOX_THRESHOLD = int(os.environ.get('FEED_INBOX_THRESHOLD', '500'))
+# Сколько последних сообщений автора попадает в inbox при подписке
+BACKFILL = int(os.environ.get('FEED_BACKFILL', '50'))
+MAX_LIMIT = 100
+
+
+def use_inbox(cur: Any, subscriber_id: int) -> bool:
+    if not FANOUT_ON_WRITE:
+        return False
+    # Без отметки feed_inbox_ready в inbox могут не быть подписки, сделанные до включения fan-out
+    cur.execute(
+        """
+        SELECT EXISTS (
+            SELECT 1 FROM t_p53416936_auxchat_energy_messa.feed_inbox_ready WHERE subscriber_id = %s
+        ) AND (
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM t_p53416936_auxchat_energy_messa.subscriptions
+                WHERE subscriber_id = %s
+                LIMIT %s
+            ) s
+        ) >= %s
+        """,
+        (subscriber_id, subscriber_id, INBOX_THRESHOLD, INBOX_THRESHOLD)
+    )
+    return cur.fetchone()[0]
+
+
+def page_query(subscriber_id: int, cursor: Optional[Tuple[datetime, int]], limit: int, inbox: bool) -> Tuple[str, tuple]:
+    '''Page subquery (id, user_id, text, created_at) for HYDRATED_MESSAGES_QUERY, newest first'''
+    cursor_sql = 'AND (created_at, id) < (%s, %s)' if cursor else ''
+    cursor_params = tuple(cursor) if cursor else ()
+    if inbox:
+        inbox_cursor = cursor_sql.replace('(created_at, id)', '(f.created_at, f.message_id)')
+        return f"""
+            SELECT m.id, m.user_id, m.text, m.created_at
+            FROM t_p53416936_auxchat_energy_messa.feed_inbox f
+            JOIN t_p53416936_auxchat_energy_messa.messages m ON m.id = f.message_id
+            WHERE f.subscriber_id = %s {inbox_cursor}
+            ORDER BY f.created_at DESC, f.message_id DESC
+            LIMIT %s
+        """, (subscriber_id,) + cursor_params + (limit,)
+    # Для каждого автора берём не больше limit сообщений по индексу (user_id, created_at, id),
+    # затем сливаем их — объём работы не зависит от размера общей ленты.
+    # Внутри слияния читаются только ключи из индекса: у активных авторов сообщений
+    # намного больше средней оценки планировщика, и с text он сортирует их все в куче
+    return f"""
+        SELECT m.id, m.user_id, m.text, m.created_at
+        FROM (
+            SELECT k.id
+            FROM t_p53416936_auxchat_energy_messa.subscriptions s
+            CROSS JOIN LATERAL (
+                SELECT id, created_at
+                FROM t_p53416936_auxchat_energy_messa.messages
+                WHERE user_id = s.subscribed_to_id {cursor_sql}
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s
+            ) k
+            WHERE s.subscriber_id = %s
+            ORDER BY k.created_at DESC, k.id DESC
+            LIMIT %s
+        ) top
+        JOIN t_p53416936_auxchat_energy_messa.messages m ON m.id = top.id
+        ORDER BY m.created_at DESC, m.id DESC
+    """, cursor_params + (limit, subscriber_id, limit)
+
+
+def fan_out(cur: Any, author_id: int, message_id: int) -> None:
+    if not FANOUT_ON_WRITE:
+        return
+    cur.execute(
+        """
+        INSERT INTO t_p53416936_auxchat_energy_messa.feed_inbox (subscriber_id, message_id, author_id, created_at)
+        SELECT s.subscriber_id, m.id, m.user_id, m.created_at
+        FROM t_p53416936_auxchat_energy_messa.subscriptions s
+        JOIN t_p53416936_auxchat_energy_messa.messages m ON m.id = %s
+        WHERE s.subscribed_to_id = %s
+        ON CONFLICT DO NOTHING
+        """,
+        (message_id, author_id)
+    )
+
+
+def backfill(cur: Any, subscriber_id: int, author_id: int) -> None:
+    if not FANOUT_ON_WRITE:
+        return
+    cur.execute(
+        """
+        INSERT INTO t_p53416936_auxchat_energy_messa.feed_inbox (subscriber_id, message_id, author_id, created_at)
+        SELECT %s, id, user_id, created_at
+        FROM t_p53416936_auxchat_energy_messa.messages
+        WHERE user_id = %s
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+        ON CONFLICT DO NOTHING
+        """,
+        (subscriber_id, author_id, BACKFILL)
+    )
+    # Первая подписка сделана уже при fan-out: inbox полон с самого начала
+    cur.execute(
+        """
+        INSERT INTO t_p53416936_auxchat_energy_messa.feed_inbox_ready (subscriber_id)
+        SELECT %s
+        WHERE (
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM t_p53416936_auxchat_energy_messa.subscriptions WHERE subscriber_id = %s LIMIT 2
+            ) s
+        ) = 1
+        ON CONFLICT DO NOTHING
+        """,
+        (subscriber_id, subscriber_id)
+    )
+
+
+def backfill_subscriber(cur: Any, subscriber_id: int) -> int:
+    '''Copy the last BACKFILL messages of every followed author into the inbox and mark it complete'''
+    cur.execute(
+        """
+        INSERT INTO t_p53416936_auxchat_energy_messa.feed_inbox (subscriber_id, message_id, author_id, created_at)
+        SELECT s.subscriber_id, m.id, m.user_id, m.created_at
+        FROM t_p53416936_auxchat_energy_messa.subscriptions s
+        CROSS JOIN LATERAL (
+            SELECT id, user_id, created_at
+            FROM t_p53416936_auxchat_energy_messa.messages
+            WHERE user_id = s.subscribed_to_id
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
+        ) m
+        WHERE s.subscriber_id = %s
+        ON CONFLICT DO NOTHING
+        """,
+        (BACKFILL, subscriber_id)
+    )
+    copied = cur.rowcount
+    cur.execute(
+        "INSERT INTO t_p53416936_auxchat_energy_messa.feed_inbox_ready (subscriber_id) VALUES (%s) ON CONFLICT DO NOTHING",
+        (subscriber_id,)
+    )
+    return copied
+
+
+def drop_author(cur: Any, subscriber_id: int, author_id: int) -> None:
+    if not FANOUT_ON_WRITE:
+        return
+    cur.execute(
+        "DELETE FROM t_p53416936_auxchat_energy_messa.feed_inbox WHERE subscriber_id = %s AND author_id = %s",
+        (subscriber_id, author_id)
+    )
@@ -0,0 +1,156 @@
+'''
+Business: One LISTEN connection per instance shared by every waiting long-poll request
+Args: channel names from handlers; LISTENER_READY_TIMEOUT from environment
+Returns: get_listener().subscribe(channel) -> Waiter, waiter.wait(timeout) -> NOTIFY payloads, unsubscribe(waiter)
+'''
+
+import os
+import select
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import psycopg2
+from . import db
+
+# Сколько ждать, пока фоновый поток выполнит LISTEN, прежде чем отказать запросу
+READY_TIMEOUT = float(os.environ.get('LISTENER_READY_TIMEOUT', '5'))
+RECONNECT_DELAY = 1.0
+
+
+class ListenerUnavailable(Exception):
+    pass
+
+
+class Waiter:
+    '''One waiting request: collects payloads for its channel until the handler takes them'''
+    
+    def __init__(self, channel: str) -> None:
+        self.channel = channel
+        self.payloads: List[str] = []
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+    
+    def deliver(self, payload: Optional[str]) -> None:
+        # None - соединение оборвалось: запрос вернётся пустым, клиент переспросит с sinceId
+        with self._lock:
+            if payload is not None:
+                self.payloads.append(payload)
+            self._event.set()
+    
+    def wait(self, timeout: float) -> List[str]:
+        self._event.wait(timeout)
+        with self._lock:
+            self._event.clear()
+            payloads, self.payloads = self.payloads, []
+        return payloads
+
+
+class Listener:
+    '''Background thread owns the connection; handlers only queue LISTEN/UNLISTEN and wait on events'''
+    
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, List[Waiter]] = {}
+        self._commands: List[Tuple[str, str, threading.Event]] = []
+        self._wake_read, self._wake_write = os.pipe()
+        self._thread: Optional[threading.Thread] = None
+    
+    def subscribe(self, channel: str) -> Waiter:
+        '''Register a waiter and return once LISTEN is active, so no NOTIFY after this call is lost'''
+        waiter = Waiter(channel)
+        done = threading.Event()
+        with self._lock:
+            self._waiters.setdefault(channel, []).append(waiter)
+            # Повторный LISTEN на тот же канал в Postgres ничего не делает, зато подтверждает готовность
+            self._commands.append(('LISTEN', channel, done))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='pg-listener', daemon=True)
+                self._thread.start()
+        os.write(self._wake_write, b'x')
+        if not done.wait(READY_TIMEOUT):
+            self.unsubscribe(waiter)
+            raise ListenerUnavailable('LISTEN connection is not ready')
+        return waiter
+    
+    def unsubscribe(self, waiter: Waiter) -> None:
+        with self._lock:
+            waiters = self._waiters.get(waiter.channel, [])
+            if waiter in waiters:
+                waiters.remove(waiter)
+            if waiters:
+                return
+            self._waiters.pop(waiter.channel, None)
+            self._commands.append(('UNLISTEN', waiter.channel, threading.Event()))
+        os.write(self._wake_write, b'x')
+    
+    def _run(self) -> None:
+        conn = None
+        while True:
+            try:
+                if conn is None:
+                    conn = db.connect_dedicated()
+                    conn.autocommit = True
+                    # После переподключения слушаем заново все каналы, на которых кто-то ждёт
+                    with self._lock:
+                        channels = list(self._waiters)
+                    with conn.cursor() as cur:
+                        for channel in channels:
+                            cur.execute(f'LISTEN {channel}')
+                self._run_commands(conn)
+                readable, _, _ = select.select([conn, self._wake_read], [], [], 60)
+                if self._wake_read in readable:
+                    os.read(self._wake_read, 4096)
+                if conn in readable:
+                    conn.poll()
+                    self._dispatch(conn)
+            except (psycopg2.Error, OSError):
+                self._drop(conn)
+                conn = None
+                time.sleep(RECONNECT_DELAY)
+    
+    def _run_commands(self, conn: Any) -> None:
+        with self._lock:
+            commands, self._commands = self._commands, []
+        with conn.cursor() as cur:
+            for index, (command, channel, done) in enumerate(commands):
+                try:
+                    cur.execute(f'{command} {channel}')
+                except psycopg2.Error:
+                    # Невыполненные команды вернутся в очередь и пройдут после переподключения
+                    with self._lock:
+                        self._commands[:0] = commands[index:]
+                    raise
+                done.set()
+        self._dispatch(conn)
+    
+    def _dispatch(self, conn: Any) -> None:
+        while conn.notifies:
+            notify = conn.notifies.pop(0)
+            with self._lock:
+                waiters = list(self._waiters.get(notify.channel, []))
+            for waiter in waiters:
+                waiter.deliver(notify.payload)
+    
+    def _drop(self, conn: Any) -> None:
+        if conn is not None:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+        # Уведомления за время обрыва потеряны: будим всех, клиенты переспросят с sinceId
+        with self._lock:
+            waiters = [waiter for channel_waiters in self._waiters.values() for waiter in channel_waiters]
+        for waiter in waiters:
+            waiter.deliver(None)
+
+
+_listener: Optional[Listener] = None
+_listener_lock = threading.Lock()
+
+
+def get_listener() -> Listener:
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = Listener()
+    return _listener
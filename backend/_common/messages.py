@@ -0,0 +1,67 @@
+'''
+Business: Shared pieces of the public message feeds - hydrated page query, keyset cursors and serialization
+Args: page subquery returning (id, user_id, text, created_at); cursor strings from clients
+Returns: HYDRATED_MESSAGES_QUERY, encode_cursor()/decode_cursor(), serialize_message(row)
+'''
+
+import base64
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+# Автор, аватар и реакции ищутся для каждой строки страницы точечно по индексам.
+# LIMIT в LATERAL не даёт планировщику свернуть их в hash join по всей таблице
+HYDRATED_MESSAGES_QUERY = """
+    WITH p AS ({page})
+    SELECT 
+        p.id, p.text, p.created_at,
+        u.id, u.username,
+        ph.photo_url,
+        COALESCE(r.reactions, '[]'::json)
+    FROM p
+    CROSS JOIN LATERAL (
+        SELECT id, username FROM t_p53416936_auxchat_energy_messa.users
+        WHERE id = p.user_id
+        LIMIT 1
+    ) u
+    LEFT JOIN LATERAL (
+        SELECT photo_url FROM t_p53416936_auxchat_energy_messa.user_photos
+        WHERE user_id = p.user_id
+        ORDER BY display_order ASC, created_at DESC
+        LIMIT 1
+    ) ph ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object('emoji', emoji, 'count', count) ORDER BY emoji) AS reactions
+        FROM t_p53416936_auxchat_energy_messa.message_reaction_counts
+        WHERE message_id = p.id AND count > 0
+    ) r ON TRUE
+    ORDER BY p.created_at DESC, p.id DESC
+"""
+
+
+def encode_cursor(created_at: datetime, message_id: int) -> str:
+    raw = f'{created_at.isoformat()}|{message_id}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[datetime, int]]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, message_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), int(message_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def serialize_message(row: tuple) -> Dict[str, Any]:
+    msg_id, text, created_at, user_id, username, photo_url, reactions = row
+    return {
+        'id': msg_id,
+        'text': text,
+        'created_at': created_at.isoformat() + 'Z',
+        'user': {
+            'id': user_id,
+            'username': username,
+            'avatar': photo_url or f'https://api.dicebear.com/7.x/avataaars/svg?seed={username}'
+        },
+        'reactions': reactions
+    }
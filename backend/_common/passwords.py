@@ -0,0 +1,80 @@
+'''
+Business: Password hashing with scrypt, a versioned hash format and upgrade of legacy SHA-256 hashes
+Args: PASSWORD_SCRYPT_LOG_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P from environment
+Returns: hash_password() -> "$scrypt$ln=..,r=..,p=..$salt$hash", verify_password(), needs_rehash()
+'''
+
+import base64
+import hashlib
+import hmac
+import os
+import re
+from typing import Dict, Optional
+
+SCHEME = 'scrypt'
+LOG_N = int(os.environ.get('PASSWORD_SCRYPT_LOG_N', '14'))
+R = int(os.environ.get('PASSWORD_SCRYPT_R', '8'))
+P = int(os.environ.get('PASSWORD_SCRYPT_P', '1'))
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+# Старые хеши — несолёный hex SHA-256 без префикса
+LEGACY_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def _derive(password: str, salt: bytes, log_n: int, r: int, p: int) -> bytes:
+    n = 1 << log_n
+    # OpenSSL по умолчанию ограничивает память 32 МБ, scrypt требует 128 * n * r * p байт
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=128 * n * r * p + 1024 * 1024, dklen=KEY_BYTES
+    )
+
+
+def _parse(stored: str) -> Optional[Dict[str, object]]:
+    parts = stored.split('$')
+    if len(parts) != 5 or parts[0] != '' or parts[1] != SCHEME:
+        return None
+    try:
+        params = dict(item.split('=', 1) for item in parts[2].split(','))
+        return {
+            'log_n': int(params['ln']),
+            'r': int(params['r']),
+            'p': int(params['p']),
+            'salt': _b64decode(parts[3]),
+            'hash': _b64decode(parts[4])
+        }
+    except (KeyError, ValueError):
+        return None
+
+
+def hash_password(password: str, log_n: int = LOG_N, r: int = R, p: int = P) -> str:
+    salt = os.urandom(SALT_BYTES)
+    key = _derive(password, salt, log_n, r, p)
+    return f'${SCHEME}$ln={log_n},r={r},p={p}${_b64encode(salt)}${_b64encode(key)}'
+
+
+def verify_password(password: str, stored: Optional[str]) -> bool:
+    if not stored:
+        return False
+    if LEGACY_SHA256.match(stored):
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+    parsed = _parse(stored)
+    if not parsed:
+        return False
+    key = _derive(password, parsed['salt'], parsed['log_n'], parsed['r'], parsed['p'])
+    return hmac.compare_digest(key, parsed['hash'])
+
+
+def needs_rehash(stored: str) -> bool:
+    '''True for legacy SHA-256 hashes and for scrypt hashes made with other cost parameters'''
+    parsed = _parse(stored)
+    return parsed is None or (parsed['log_n'], parsed['r'], parsed['p']) != (LOG_N, R, P)
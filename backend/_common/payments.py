@@ -0,0 +1,80 @@
+'''
+Business: Idempotent crediting of YooKassa payment.succeeded events
+Args: parsed webhook body; cursor from _common.db
+Returns: parse_event() -> (payment, error), apply_payment() -> True if credited, False if already processed,
+         apply_payments() -> number of credited payments in a batch
+'''
+
+from typing import Any, Dict, List, Optional, Tuple
+
+SUCCEEDED_EVENT = 'payment.succeeded'
+
+
+def parse_event(body: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    '''Validate a YooKassa notification; returns (None, None) for events we ignore'''
+    if body.get('event') != SUCCEEDED_EVENT:
+        return None, None
+    
+    payment_object = body.get('object') or {}
+    metadata = payment_object.get('metadata') or {}
+    payment_id = payment_object.get('id')
+    user_id = metadata.get('user_id')
+    energy_amount = metadata.get('energy_amount')
+    
+    if not payment_id or not user_id or not energy_amount:
+        return None, 'Invalid metadata'
+    
+    try:
+        payment = {'id': str(payment_id), 'user_id': int(user_id), 'energy_amount': int(energy_amount)}
+    except (TypeError, ValueError):
+        return None, 'Invalid metadata'
+    
+    if payment['energy_amount'] <= 0:
+        return None, 'Invalid metadata'
+    
+    return payment, None
+
+
+def apply_payment(cur: Any, payment: Dict[str, Any]) -> bool:
+    '''Claim the payment id and append the credit in one statement; duplicates stop at the claim'''
+    cur.execute(
+        """
+        WITH claimed AS (
+            INSERT INTO t_p53416936_auxchat_energy_messa.processed_payments (payment_id, user_id, energy_amount)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (payment_id) DO NOTHING
+            RETURNING payment_id, user_id, energy_amount
+        )
+        INSERT INTO t_p53416936_auxchat_energy_messa.energy_ledger (user_id, amount, reason, reference)
+        SELECT user_id, energy_amount, 'payment', payment_id FROM claimed
+        """,
+        (payment['id'], payment['user_id'], payment['energy_amount'])
+    )
+    return cur.rowcount > 0
+
+
+def apply_payments(cur: Any, payments: List[Dict[str, Any]]) -> int:
+    '''Bulk variant of apply_payment for replays; returns how many payments were credited'''
+    if not payments:
+        return 0
+    cur.execute(
+        """
+        WITH incoming AS (
+            SELECT * FROM unnest(%s::varchar[], %s::integer[], %s::integer[]) AS t(payment_id, user_id, energy_amount)
+        ),
+        claimed AS (
+            INSERT INTO t_p53416936_auxchat_energy_messa.processed_payments (payment_id, user_id, energy_amount)
+            SELECT payment_id, user_id, energy_amount FROM incoming
+            ON CONFLICT (payment_id) DO NOTHING
+            RETURNING payment_id, user_id, energy_amount
+        )
+        INSERT INTO t_p53416936_auxchat_energy_messa.energy_ledger (user_id, amount, reason, reference)
+        SELECT user_id, energy_amount, 'payment', payment_id FROM claimed
+        """,
+        (
+            [payment['id'] for payment in payments],
+            [payment['user_id'] for payment in payments],
+            [payment['energy_amount'] for payment in payments]
+        )
+    )
+    return cur.rowcount
@@ -0,0 +1,151 @@
+'''
+Business: User presence - write-behind heartbeat buffer and bulk online-status lookup
+Args: cursor/connection from _common.db; PRESENCE_* settings from environment
+Returns: touch()/flush_if_due() for heartbeats, is_online() and get_store().lookup(ids) for reads
+'''
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+from .db import get_conn, put_conn
+
+FLUSH_INTERVAL = float(os.environ.get('PRESENCE_FLUSH_INTERVAL', '300'))
+ONLINE_WINDOW = timedelta(minutes=float(os.environ.get('PRESENCE_ONLINE_MINUTES', '5')))
+CACHE_TTL = float(os.environ.get('PRESENCE_CACHE_TTL', '15'))
+CACHE_SIZE = int(os.environ.get('PRESENCE_CACHE_SIZE', '10000'))
+MAX_LOOKUP_IDS = 300
+
+# Ключ advisory-lock, чтобы параллельные инстансы не сбрасывали буфер одновременно
+FLUSH_LOCK_KEY = 53416936
+
+_last_flush = time.monotonic()
+
+
+def touch(cur: Any, user_id: int) -> None:
+    '''Record a heartbeat in the unlogged buffer instead of updating the users row'''
+    cur.execute(
+        """
+        INSERT INTO t_p53416936_auxchat_energy_messa.user_presence (user_id, last_seen)
+        VALUES (%s, CURRENT_TIMESTAMP)
+        ON CONFLICT (user_id) DO UPDATE SET last_seen = EXCLUDED.last_seen
+        """,
+        (user_id,)
+    )
+
+
+def flush_if_due(conn: Any) -> int:
+    '''Copy buffered heartbeats into users.last_activity in one bulk UPDATE at most once per interval'''
+    global _last_flush
+    if time.monotonic() - _last_flush < FLUSH_INTERVAL:
+        return 0
+    _last_flush = time.monotonic()
+    
+    cur = conn.cursor()
+    cur.execute('SELECT pg_try_advisory_xact_lock(%s)', (FLUSH_LOCK_KEY,))
+    if not cur.fetchone()[0]:
+        cur.close()
+        conn.commit()
+        return 0
+    
+    cur.execute("""
+        UPDATE t_p53416936_auxchat_energy_messa.users u
+        SET last_activity = p.last_seen
+        FROM t_p53416936_auxchat_energy_messa.user_presence p
+        WHERE p.user_id = u.id AND (u.last_activity IS NULL OR p.last_seen > u.last_activity)
+    """)
+    flushed = cur.rowcount
+    
+    # Давно неактивные и уже сброшенные записи буферу больше не нужны
+    cur.execute("""
+        DELETE FROM t_p53416936_auxchat_energy_messa.user_presence p
+        USING t_p53416936_auxchat_energy_messa.users u
+        WHERE u.id = p.user_id AND p.last_seen <= u.last_activity
+          AND p.last_seen < CURRENT_TIMESTAMP - INTERVAL '1 hour'
+    """)
+    conn.commit()
+    cur.close()
+    return flushed
+
+
+def is_online(last_seen: Optional[datetime], now: Optional[datetime] = None) -> bool:
+    if not last_seen:
+        return False
+    return (now or datetime.utcnow()) - last_seen < ONLINE_WINDOW
+
+
+class PostgresPresenceBackend:
+    '''Reads the fresher of users.last_activity and the unflushed heartbeat buffer'''
+    
+    def fetch(self, user_ids: Iterable[int]) -> Dict[int, Optional[datetime]]:
+        conn = get_conn()
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT u.id, GREATEST(u.last_activity, p.last_seen)
+            FROM t_p53416936_auxchat_energy_messa.users u
+            LEFT JOIN t_p53416936_auxchat_energy_messa.user_presence p ON p.user_id = u.id
+            WHERE u.id = ANY(%s)
+            """,
+            (list(user_ids),)
+        )
+        result = {row[0]: row[1] for row in cur.fetchall()}
+        cur.close()
+        put_conn(conn)
+        return result
+
+
+class PresenceStore:
+    '''In-process LRU with TTL in front of a presence backend; misses are fetched in one batch'''
+    
+    def __init__(self, backend: Any, ttl: float = CACHE_TTL, size: int = CACHE_SIZE) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.size = size
+        self._cache: 'OrderedDict[int, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def lookup(self, user_ids: Iterable[int]) -> Dict[int, Optional[datetime]]:
+        now = time.monotonic()
+        result: Dict[int, Optional[datetime]] = {}
+        missing = []
+        with self._lock:
+            for user_id in user_ids:
+                cached = self._cache.get(user_id)
+                if cached and cached[0] > now:
+                    self._cache.move_to_end(user_id)
+                    # Неизвестных пользователей не отдаём, известных без активности - отдаём с None
+                    if cached[1]:
+                        result[user_id] = cached[2]
+                else:
+                    missing.append(user_id)
+        if missing:
+            fetched = self.backend.fetch(missing)
+            with self._lock:
+                for user_id in missing:
+                    # Отсутствующих пользователей тоже кешируем, чтобы не ходить за ними в БД
+                    self._cache[user_id] = (now + self.ttl, user_id in fetched, fetched.get(user_id))
+                    self._cache.move_to_end(user_id)
+                # Ids приходят из запроса как есть: без предела кеш рос бы от любых перебираемых ids
+                while self._cache and next(iter(self._cache.values()))[0] <= now:
+                    self._cache.popitem(last=False)
+                while len(self._cache) > self.size:
+                    self._cache.popitem(last=False)
+            result.update(fetched)
+        return result
+    
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._cache.pop(user_id, None)
+
+
+_store: Optional[PresenceStore] = None
+
+
+def get_store() -> PresenceStore:
+    global _store
+    if _store is None:
+        _store = PresenceStore(PostgresPresenceBackend())
+    return _store
@@ -0,0 +1,172 @@
+'''
+Business: Read-through cache of user profiles (user row + gallery photos) validated by users.profile_version
+Args: cursor from _common.db; PROFILE_CACHE_TTL, PROFILE_CACHE_SIZE from environment
+Returns: current_state() -> (energy, version), get_cache().get(user_id, version) -> profile dict or None,
+         load_profile(), bump_version() for writers, etag(), not_modified()
+
+Writers bump profile_version in the same transaction as the change. A cached copy is served only while
+its version matches the one just read, so every instance sees a ban or new photo on the next request.
+Energy changes on every send and payment, so it is not cached - current_state() reads it with the version.
+'''
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from .db import get_conn, put_conn
+from .energy import BALANCE_SQL
+from .queries import statement, execute
+
+CACHE_TTL = float(os.environ.get('PROFILE_CACHE_TTL', '30'))
+CACHE_SIZE = int(os.environ.get('PROFILE_CACHE_SIZE', '1000'))
+MAX_PHOTOS = 6
+
+PROFILE_QUERY = statement('profile_load', ('integer',), f"""
+    SELECT u.id, u.phone, u.username, u.avatar_url, u.is_banned, u.bio, u.profile_version,
+           COALESCE((
+               SELECT json_agg(json_build_object('id', ph.id, 'url', ph.photo_url, 'created_at', ph.created_at,
+                                                 'order', ph.display_order)
+                               ORDER BY ph.display_order ASC, ph.created_at DESC)
+               FROM (
+                   SELECT id, photo_url, created_at, display_order
+                   FROM t_p53416936_auxchat_energy_messa.user_photos
+                   WHERE user_id = u.id
+                   ORDER BY display_order ASC, created_at DESC
+                   LIMIT {MAX_PHOTOS}
+               ) ph
+           ), '[]'::json)
+    FROM t_p53416936_auxchat_energy_messa.users u
+    WHERE u.id = $1
+""")
+
+
+def _load(cur: Any, user_id: int) -> Optional[Tuple[int, Dict[str, Any]]]:
+    execute(cur, PROFILE_QUERY, (user_id,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    return row[6], {
+        'id': row[0],
+        'phone': row[1],
+        'username': row[2],
+        'avatar': row[3] if row[3] else '',
+        'is_admin': False,
+        'is_banned': row[4] if row[4] is not None else False,
+        'bio': row[5] if row[5] else '',
+        'photos': row[7]
+    }
+
+
+def load_profile(cur: Any, user_id: int) -> Optional[Dict[str, Any]]:
+    '''User fields and gallery in one query, bypassing the cache; presence and energy are not included'''
+    loaded = _load(cur, user_id)
+    return loaded[1] if loaded else None
+
+
+def current_state(cur: Any, user_id: int) -> Optional[Tuple[int, int]]:
+    '''Fresh balance and profile_version in one primary-key read; None if the user does not exist'''
+    cur.execute(
+        f"SELECT {BALANCE_SQL}, u.profile_version FROM t_p53416936_auxchat_energy_messa.users u WHERE u.id = %s",
+        (user_id,)
+    )
+    row = cur.fetchone()
+    return (row[0], row[1]) if row else None
+
+
+def bump_version(cur: Any, user_id: int) -> None:
+    '''Call in the writer's transaction after changing profile fields or the gallery'''
+    cur.execute(
+        "UPDATE t_p53416936_auxchat_energy_messa.users SET profile_version = profile_version + 1 WHERE id = %s",
+        (user_id,)
+    )
+
+
+class MemorySharedBackend:
+    '''Stand-in for a cache shared between instances (get/set/delete by key)'''
+    
+    def __init__(self) -> None:
+        self._data: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+    
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+    
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class ProfileCache:
+    '''In-process LRU with TTL, optionally backed by a shared cache; misses and stale versions are loaded from Postgres'''
+    
+    def __init__(self, ttl: float = CACHE_TTL, size: int = CACHE_SIZE, shared: Optional[Any] = None) -> None:
+        self.ttl = ttl
+        self.size = size
+        self.shared = shared
+        self._entries: 'OrderedDict[int, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, user_id: int, version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        '''Cached profile if it is fresh and, when version is given, was loaded at that version'''
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > now and version in (None, entry[1]):
+                self._entries.move_to_end(user_id)
+                return entry[2]
+        
+        loaded = self.shared.get(f'profile:{user_id}') if self.shared else None
+        if loaded is None or version not in (None, loaded[0]):
+            conn = get_conn()
+            cur = conn.cursor()
+            loaded = _load(cur, user_id)
+            cur.close()
+            put_conn(conn)
+            if loaded is None:
+                return None
+            if self.shared:
+                self.shared.set(f'profile:{user_id}', loaded, self.ttl)
+        
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl, loaded[0], loaded[1])
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return loaded[1]
+    
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(int(user_id), None)
+        if self.shared:
+            self.shared.delete(f'profile:{int(user_id)}')
+
+
+_cache: Optional[ProfileCache] = None
+
+
+def get_cache() -> ProfileCache:
+    global _cache
+    if _cache is None:
+        shared = MemorySharedBackend() if os.environ.get('PROFILE_CACHE_SHARED') == 'memory' else None
+        _cache = ProfileCache(shared=shared)
+    return _cache
+
+
+def etag(body: str) -> str:
+    return '"' + hashlib.sha1(body.encode()).hexdigest()[:20] + '"'
+
+
+def not_modified(event: Dict[str, Any], tag: str) -> bool:
+    headers = event.get('headers') or {}
+    sent = headers.get('If-None-Match') or headers.get('if-none-match') or ''
+    return tag in [value.strip() for value in sent.split(',')] or sent.strip() == '*'
@@ -0,0 +1,72 @@
+'''
+Business: Named server-side prepared statements so hot polling queries are planned once per connection
+Args: statement(name, types, sql) with $1..$n placeholders; DB_PREPARE_STATEMENTS from environment
+Returns: statement() declarations, execute(cur, stmt, params) that PREPAREs lazily and then EXECUTEs, render()
+'''
+
+import os
+import re
+import threading
+import weakref
+from functools import lru_cache
+from typing import Any, Dict, NamedTuple, Sequence, Set, Tuple
+
+# За пулером в режиме транзакций (pgbouncer) PREPARE не переживает смену серверного соединения
+PREPARE_STATEMENTS = os.environ.get('DB_PREPARE_STATEMENTS', '1') != '0'
+
+_PLACEHOLDER = re.compile(r'\$(\d+)')
+_NAME = re.compile(r'^[a-z_][a-z0-9_]*$')
+
+# Какие statement'ы уже подготовлены на каждом соединении пула; запись исчезает вместе с соединением
+_prepared: 'weakref.WeakKeyDictionary[Any, Set[str]]' = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+class Statement(NamedTuple):
+    name: str
+    types: Tuple[str, ...]
+    sql: str
+
+
+def statement(name: str, types: Sequence[str], sql: str) -> Statement:
+    '''Declare a statement at module level; placeholders must be numbered $1..$n matching types'''
+    if not _NAME.match(name):
+        raise ValueError(f'Invalid statement name: {name}')
+    used = {int(n) for n in _PLACEHOLDER.findall(sql)}
+    if used and max(used) > len(types):
+        raise ValueError(f'Statement {name} uses ${max(used)} but declares {len(types)} types')
+    return Statement(name, tuple(types), sql)
+
+
+@lru_cache(maxsize=None)
+def _inline(sql: str) -> str:
+    return _PLACEHOLDER.sub(lambda m: f'%(p{m.group(1)})s', sql.replace('%', '%%'))
+
+
+def render(stmt: Statement, params: Sequence[Any]) -> Tuple[str, Dict[str, Any]]:
+    '''Same statement as plain psycopg2 SQL and params, for the non-prepared fallback and benchmarks'''
+    return _inline(stmt.sql), {f'p{i}': value for i, value in enumerate(params, 1)}
+
+
+def execute(cur: Any, stmt: Statement, params: Sequence[Any] = ()) -> None:
+    '''Run stmt on cur; the first call on a connection sends PREPARE, later calls only EXECUTE'''
+    if len(params) != len(stmt.types):
+        raise ValueError(f'Statement {stmt.name} expects {len(stmt.types)} params, got {len(params)}')
+    
+    if not PREPARE_STATEMENTS:
+        cur.execute(*render(stmt, params))
+        return
+    
+    with _lock:
+        names = _prepared.setdefault(cur.connection, set())
+    
+    if stmt.name not in names:
+        types = f" ({', '.join(stmt.types)})" if stmt.types else ''
+        # PREPARE не транзакционный: откат транзакции обработчика его не отменяет
+        cur.execute(f'PREPARE {stmt.name}{types} AS {stmt.sql}')
+        names.add(stmt.name)
+    
+    if params:
+        cur.execute(f"EXECUTE {stmt.name} ({', '.join(['%s'] * len(params))})", tuple(params))
+    else:
+        cur.execute(f'EXECUTE {stmt.name}')
@@ -0,0 +1,138 @@
+'''
+Business: Token-bucket rate limiting with per-endpoint policies and Postgres / in-memory backends
+Args: policy name and identity (phone, user id, client IP); RATE_LIMIT_BACKEND from environment
+Returns: get_limiter().allow(policy, identity) -> (allowed, retry_after seconds), too_many_requests() response
+'''
+
+import json
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+from .db import get_conn, put_conn
+
+
+class Policy(NamedTuple):
+    capacity: int
+    per_seconds: float
+    
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.per_seconds
+
+
+# Ёмкость ведра и время его полного восполнения
+POLICIES: Dict[str, Policy] = {
+    'send-sms:phone': Policy(3, 600),
+    'send-sms:ip': Policy(10, 3600),
+    'login:phone': Policy(10, 300),
+    'login:ip': Policy(30, 60),
+    'send-message:user': Policy(20, 20),
+}
+
+# Вёдра, не трогавшиеся дольше этого срока, заведомо полны и удаляются
+STALE_AFTER = 24 * 3600
+
+
+def client_ip(event: Dict[str, Any]) -> str:
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    if identity.get('sourceIp'):
+        return identity['sourceIp']
+    headers = event.get('headers') or {}
+    forwarded = headers.get('X-Forwarded-For') or headers.get('x-forwarded-for') or ''
+    return forwarded.split(',')[0].strip() or 'unknown'
+
+
+def too_many_requests(retry_after: int) -> Dict[str, Any]:
+    return {
+        'statusCode': 429,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Retry-After': str(retry_after)
+        },
+        'body': json.dumps({'error': 'Слишком много запросов, попробуйте позже', 'retryAfter': retry_after})
+    }
+
+
+class PostgresRateLimitBackend:
+    '''One UPSERT per check: refill, test and take a token atomically; shared by all instances'''
+    
+    def allow(self, policy_name: str, identity: Any) -> Tuple[bool, int]:
+        policy = POLICIES[policy_name]
+        conn = get_conn()
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO t_p53416936_auxchat_energy_messa.rate_limits AS r (bucket, tokens, updated_at)
+            VALUES (%(bucket)s, %(capacity)s - 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (bucket) DO UPDATE SET
+                tokens = LEAST(%(capacity)s, r.tokens + EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - r.updated_at) * %(rate)s) - 1,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE LEAST(%(capacity)s, r.tokens + EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - r.updated_at) * %(rate)s) >= 1
+            RETURNING tokens
+            """,
+            {'bucket': f'{policy_name}:{identity}', 'capacity': policy.capacity, 'rate': policy.rate}
+        )
+        allowed = cur.fetchone() is not None
+        conn.commit()
+        cur.close()
+        put_conn(conn)
+        # При отказе строка не меняется, поэтому точный остаток неизвестен — отдаём верхнюю оценку
+        return allowed, 0 if allowed else math.ceil(1 / policy.rate)
+    
+    def sweep(self) -> int:
+        conn = get_conn()
+        cur = conn.cursor()
+        cur.execute(
+            "DELETE FROM t_p53416936_auxchat_energy_messa.rate_limits WHERE updated_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'",
+            (STALE_AFTER,)
+        )
+        deleted = cur.rowcount
+        conn.commit()
+        cur.close()
+        put_conn(conn)
+        return deleted
+
+
+class MemoryRateLimitBackend:
+    '''Per-instance buckets for tests and single-instance deployments'''
+    
+    def __init__(self) -> None:
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+    
+    def allow(self, policy_name: str, identity: Any) -> Tuple[bool, int]:
+        policy = POLICIES[policy_name]
+        bucket = f'{policy_name}:{identity}'
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(bucket, (float(policy.capacity), now))
+            tokens = min(policy.capacity, tokens + (now - updated_at) * policy.rate)
+            if tokens < 1:
+                self._buckets[bucket] = (tokens, now)
+                return False, math.ceil((1 - tokens) / policy.rate)
+            self._buckets[bucket] = (tokens - 1, now)
+            return True, 0
+    
+    def sweep(self) -> int:
+        cutoff = time.monotonic() - STALE_AFTER
+        with self._lock:
+            stale = [bucket for bucket, (_, updated_at) in self._buckets.items() if updated_at < cutoff]
+            for bucket in stale:
+                del self._buckets[bucket]
+        return len(stale)
+
+
+_limiter: Optional[Any] = None
+
+
+def get_limiter() -> Any:
+    global _limiter
+    if _limiter is None:
+        if os.environ.get('RATE_LIMIT_BACKEND') == 'memory':
+            _limiter = MemoryRateLimitBackend()
+        else:
+            _limiter = PostgresRateLimitBackend()
+    return _limiter
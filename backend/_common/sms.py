@@ -0,0 +1,201 @@
+'''
+Business: SMS outbox - enqueue from handlers, drain in batches with concurrent sends and exponential backoff
+Args: cursor/connection from _common.db; SMS_PROVIDER, SMSRU_API_KEY, SMS_* settings from environment
+Returns: enqueue() for handlers, drain() and sweep() for sms-worker, SmsRuProvider / FakeSmsProvider via get_provider()
+'''
+
+import json
+import math
+import os
+import threading
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+BATCH_SIZE = int(os.environ.get('SMS_BATCH_SIZE', '50'))
+CONCURRENCY = int(os.environ.get('SMS_CONCURRENCY', '8'))
+MAX_ATTEMPTS = int(os.environ.get('SMS_MAX_ATTEMPTS', '5'))
+BACKOFF_BASE = float(os.environ.get('SMS_BACKOFF_BASE', '5'))
+BACKOFF_MAX = float(os.environ.get('SMS_BACKOFF_MAX', '600'))
+HTTP_TIMEOUT = float(os.environ.get('SMS_HTTP_TIMEOUT', '10'))
+# Запас аренды сверх худшего времени пачки: коммит, пул потоков, задержки сети
+LEASE_MARGIN = float(os.environ.get('SMS_LEASE_MARGIN', '15'))
+SWEEP_BATCH = int(os.environ.get('SMS_SWEEP_BATCH', '1000'))
+SWEEP_MAX_BATCHES = int(os.environ.get('SMS_SWEEP_MAX_BATCHES', '20'))
+
+
+class SmsError(Exception):
+    pass
+
+
+class SmsRuProvider:
+    def __init__(self, api_key: str) -> None:
+        self.api_key = api_key
+    
+    def send(self, phone: str, message: str) -> None:
+        params = urllib.parse.urlencode({'api_id': self.api_key, 'to': phone, 'msg': message, 'json': 1})
+        response = urllib.request.urlopen(f'https://sms.ru/sms/send?{params}', timeout=HTTP_TIMEOUT)
+        result = json.loads(response.read().decode('utf-8'))
+        if result.get('status') != 'OK':
+            raise SmsError(f"sms.ru: {result.get('status_code')} {result.get('status_text', '')}".strip())
+
+
+class FakeSmsProvider:
+    '''Records messages instead of sending them; fail_times makes the first sends per phone fail'''
+    
+    def __init__(self, fail_times: int = 0) -> None:
+        self.fail_times = fail_times
+        self.sent: List[Tuple[str, str]] = []
+        self._failures: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    def send(self, phone: str, message: str) -> None:
+        with self._lock:
+            failed = self._failures.get(phone, 0)
+            if failed < self.fail_times:
+                self._failures[phone] = failed + 1
+                raise SmsError('fake provider failure')
+            self.sent.append((phone, message))
+
+
+def get_provider() -> Any:
+    if os.environ.get('SMS_PROVIDER') == 'fake':
+        return FakeSmsProvider()
+    api_key = os.environ.get('SMSRU_API_KEY')
+    if not api_key:
+        raise SmsError('SMS API not configured')
+    return SmsRuProvider(api_key)
+
+
+def enqueue(cur: Any, phone: str, message: str) -> None:
+    cur.execute(
+        "INSERT INTO t_p53416936_auxchat_energy_messa.sms_outbox (phone, message) VALUES (%s, %s)",
+        (phone, message)
+    )
+
+
+def backoff(attempts: int) -> float:
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+
+
+def batch_seconds(batch_size: int, concurrency: int = CONCURRENCY) -> float:
+    '''Worst case for one batch: every round of concurrent sends waits out HTTP_TIMEOUT'''
+    return math.ceil(batch_size / concurrency) * HTTP_TIMEOUT
+
+
+def fitting_batch(seconds: float, concurrency: int = CONCURRENCY) -> int:
+    '''Largest batch that finishes within seconds even if every send times out'''
+    return min(BATCH_SIZE, int(seconds // HTTP_TIMEOUT) * concurrency)
+
+
+def _send(provider: Any, item: Tuple[int, str, str, int]) -> Optional[str]:
+    try:
+        provider.send(item[1], item[2])
+        return None
+    except Exception as e:
+        return str(e) or e.__class__.__name__
+
+
+def drain(conn: Any, provider: Any, batch_size: int = BATCH_SIZE, concurrency: int = CONCURRENCY) -> Dict[str, int]:
+    '''Claim one batch of due messages, send them concurrently and record the outcome'''
+    # Аренда длиннее худшего времени пачки, иначе другой запуск воркера перезахватит её и отправит платные SMS повторно
+    lease = batch_seconds(batch_size, concurrency) + LEASE_MARGIN
+    cur = conn.cursor()
+    cur.execute(
+        """
+        UPDATE t_p53416936_auxchat_energy_messa.sms_outbox
+        SET attempts = attempts + 1, next_attempt_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+        WHERE id IN (
+            SELECT id FROM t_p53416936_auxchat_energy_messa.sms_outbox
+            WHERE status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP
+            ORDER BY next_attempt_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, phone, message, attempts
+        """,
+        (lease, batch_size)
+    )
+    batch = cur.fetchall()
+    conn.commit()
+    if not batch:
+        cur.close()
+        return {'claimed': 0, 'sent': 0, 'retried': 0, 'failed': 0}
+    
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(batch))) as pool:
+        errors = list(pool.map(lambda item: _send(provider, item), batch))
+    
+    sent = [item for item, error in zip(batch, errors) if error is None]
+    failed = [(item, error) for item, error in zip(batch, errors) if error is not None]
+    
+    # Итог пишем, только если запись всё ещё за нами: после перезахвата attempts уже другой
+    if sent:
+        cur.execute(
+            """
+            UPDATE t_p53416936_auxchat_energy_messa.sms_outbox o
+            SET status = 'sent', sent_at = CURRENT_TIMESTAMP, last_error = NULL
+            FROM unnest(%s::bigint[], %s::integer[]) AS s(id, attempts)
+            WHERE o.id = s.id AND o.attempts = s.attempts
+            """,
+            ([item[0] for item in sent], [item[3] for item in sent])
+        )
+    if failed:
+        cur.execute(
+            """
+            UPDATE t_p53416936_auxchat_energy_messa.sms_outbox o
+            SET status = CASE WHEN o.attempts >= %s THEN 'failed' ELSE 'pending' END,
+                next_attempt_at = CURRENT_TIMESTAMP + f.delay * INTERVAL '1 second',
+                last_error = f.error
+            FROM unnest(%s::bigint[], %s::integer[], %s::double precision[], %s::text[]) AS f(id, attempts, delay, error)
+            WHERE o.id = f.id AND o.attempts = f.attempts
+            """,
+            (
+                MAX_ATTEMPTS,
+                [item[0] for item, _ in failed],
+                [item[3] for item, _ in failed],
+                [backoff(item[3]) for item, _ in failed],
+                [error for _, error in failed]
+            )
+        )
+    conn.commit()
+    cur.close()
+    
+    gave_up = sum(1 for item, _ in failed if item[3] >= MAX_ATTEMPTS)
+    return {'claimed': len(batch), 'sent': len(sent), 'retried': len(failed) - gave_up, 'failed': gave_up}
+
+
+def _delete_in_batches(conn: Any, query: str) -> int:
+    cur = conn.cursor()
+    deleted = 0
+    for _ in range(SWEEP_MAX_BATCHES):
+        cur.execute(query, (SWEEP_BATCH,))
+        conn.commit()
+        deleted += cur.rowcount
+        if cur.rowcount < SWEEP_BATCH:
+            break
+    cur.close()
+    return deleted
+
+
+def sweep(conn: Any) -> Dict[str, int]:
+    '''Delete long-expired codes and settled outbox rows in short bounded transactions'''
+    codes = _delete_in_batches(conn, """
+        DELETE FROM sms_codes
+        WHERE id IN (
+            SELECT id FROM sms_codes
+            WHERE expires_at < CURRENT_TIMESTAMP - INTERVAL '1 hour'
+            ORDER BY expires_at
+            LIMIT %s
+        )
+    """)
+    outbox = _delete_in_batches(conn, """
+        DELETE FROM t_p53416936_auxchat_energy_messa.sms_outbox
+        WHERE id IN (
+            SELECT id FROM t_p53416936_auxchat_energy_messa.sms_outbox
+            WHERE status <> 'pending' AND created_at < CURRENT_TIMESTAMP - INTERVAL '1 day'
+            ORDER BY id
+            LIMIT %s
+        )
+    """)
+    return {'codes': codes, 'outbox': outbox}
@@ -0,0 +1,59 @@
+'''
+Business: One-off fill of feed_inbox for subscriptions made before FEED_FANOUT_ON_WRITE was switched on
+Args: DATABASE_URL; --min-follows (default FEED_INBOX_THRESHOLD), --limit; run after writers have fan-out enabled
+Returns: prints subscribers marked ready in feed_inbox_ready and inbox rows copied
+'''
+
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from _common.feed import INBOX_THRESHOLD, backfill_subscriber
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--min-follows', type=int, default=INBOX_THRESHOLD)
+    parser.add_argument('--limit', type=int, default=None, help='stop after this many subscribers')
+    args = parser.parse_args()
+    
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT s.subscriber_id
+        FROM t_p53416936_auxchat_energy_messa.subscriptions s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM t_p53416936_auxchat_energy_messa.feed_inbox_ready r WHERE r.subscriber_id = s.subscriber_id
+        )
+        GROUP BY s.subscriber_id
+        HAVING COUNT(*) >= %s
+        ORDER BY s.subscriber_id
+        LIMIT %s
+        """,
+        (args.min_follows, args.limit)
+    )
+    subscribers = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    
+    started = time.perf_counter()
+    copied = 0
+    # По транзакции на подписчика: прерванный прогон можно повторить, готовые подписчики уже отмечены
+    for subscriber_id in subscribers:
+        copied += backfill_subscriber(cur, subscriber_id)
+        conn.commit()
+    
+    cur.close()
+    conn.close()
+    print(f'{len(subscribers)} subscribers ready, {copied} inbox rows copied in {time.perf_counter() - started:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+'''
+Business: Index audit of the hot paths - run each handler, EXPLAIN (ANALYZE, BUFFERS) every statement it sent
+Args: DATABASE_URL pointing at a seeded local database (never production: handlers write); --min-rows, --max-buffers, --verbose
+Returns: prints plan summary per statement; exits 1 if a hot path seq-scans a table of at least --min-rows rows
+         or touches more than --max-buffers shared buffers
+'''
+
+import argparse
+import json
+import os
+import re
+import sys
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from _bench.handlers import load_handler_module
+from _common import db
+
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'EXECUTE')
+
+_recording = False
+_captured: List[Tuple[Any, str, Any]] = []
+
+
+class RecordingCursor(psycopg2.extensions.cursor):
+    '''Remembers every statement a handler sends so it can be explained afterwards'''
+    def execute(self, query: Any, vars: Any = None) -> Any:
+        if _recording:
+            _captured.append((self.connection, query.decode() if isinstance(query, bytes) else str(query), vars))
+        return super().execute(query, vars)
+
+
+def sample(cur: Any) -> Optional[Dict[str, Any]]:
+    '''Ids of busy rows so every scenario touches real data'''
+    cur.execute("""
+        SELECT pm.sender_id, pm.receiver_id FROM t_p53416936_auxchat_energy_messa.private_messages pm
+        WHERE NOT EXISTS (
+            SELECT 1 FROM t_p53416936_auxchat_energy_messa.blacklist b
+            WHERE (b.user_id = pm.sender_id AND b.blocked_user_id = pm.receiver_id)
+               OR (b.user_id = pm.receiver_id AND b.blocked_user_id = pm.sender_id)
+        )
+        GROUP BY 1, 2 ORDER BY COUNT(*) DESC LIMIT 1
+    """)
+    pair = cur.fetchone()
+    cur.execute("""
+        SELECT subscriber_id FROM t_p53416936_auxchat_energy_messa.subscriptions
+        GROUP BY 1 ORDER BY COUNT(*) DESC LIMIT 1
+    """)
+    follower = cur.fetchone()
+    cur.execute('SELECT id FROM t_p53416936_auxchat_energy_messa.messages ORDER BY id DESC LIMIT 1')
+    message = cur.fetchone()
+    if not pair or not follower or not message:
+        return None
+    cur.execute('SELECT phone FROM t_p53416936_auxchat_energy_messa.users WHERE id = %s', (pair[0],))
+    return {
+        'user': pair[0], 'other': pair[1], 'follower': follower[0],
+        'message': message[0], 'phone': cur.fetchone()[0]
+    }
+
+
+def scenarios(ids: Dict[str, Any]) -> List[Tuple[str, str, Any, Any, Dict[str, str]]]:
+    '''(handler, method, query params, body, headers) of the calls clients make while chatting and polling'''
+    me = {'X-User-Id': str(ids['user'])}
+    user, other = str(ids['user']), str(ids['other'])
+    return [
+        ('get-messages', 'GET', {'limit': '20'}, None, {}),
+        ('get-feed', 'GET', {'limit': '20'}, None, {'X-User-Id': str(ids['follower'])}),
+        ('private-messages', 'GET', {'otherUserId': other}, None, me),
+        ('private-messages', 'GET', {'otherUserId': other, 'sinceId': '0'}, None, me),
+        ('private-messages', 'POST', None, {'receiverId': ids['other'], 'text': 'audit'}, me),
+        ('get-conversations', 'GET', {}, None, me),
+        ('get-user', 'GET', {'user_id': other}, None, {}),
+        ('get-users', 'GET', {'ids': f'{user},{other}'}, None, {}),
+        ('presence', 'GET', {'ids': f'{user},{other}'}, None, {}),
+        ('get-subscriptions', 'GET', {}, None, me),
+        ('subscribe', 'GET', {'targetUserId': other}, None, me),
+        ('blacklist', 'GET', {}, None, me),
+        ('update-activity', 'POST', None, {}, me),
+        ('add-reaction', 'POST', None, {'user_id': ids['user'], 'message_id': ids['message'], 'emoji': '👍'}, {}),
+        ('send-message', 'POST', None, {'user_id': ids['user'], 'text': 'audit'}, me),
+        ('login', 'POST', None, {'phone': ids['phone'], 'password': 'not-the-password'}, {}),
+    ]
+
+
+def seq_scans(node: Dict[str, Any]) -> List[str]:
+    found = [node['Relation Name']] if node.get('Node Type') == 'Seq Scan' else []
+    for child in node.get('Plans', []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def split_statements(query: str, vars: Any) -> List[Tuple[str, Any]]:
+    '''Handlers may send "lock; query" in one call; positional params are split by placeholder count'''
+    # Точка с запятой в SQL-комментарии не разделяет запросы
+    parts = [part for part in re.sub(r'--[^\n]*', '', query).split(';') if part.strip()]
+    if len(parts) < 2 or not isinstance(vars, (tuple, list)):
+        return [(part, vars) for part in parts]
+    result, rest = [], list(vars)
+    for part in parts:
+        count = part.replace('%%', '').count('%s')
+        result.append((part, tuple(rest[:count])))
+        rest = rest[count:]
+    return result
+
+
+def explain(conn: Any, statements: List[Tuple[str, Any]]) -> Dict[str, Any]:
+    '''Run the setup statements and EXPLAIN ANALYZE the last one in a transaction that is rolled back'''
+    cur = conn.cursor()
+    try:
+        for setup, setup_vars in statements[:-1]:
+            cur.execute(setup, setup_vars)
+        body, vars = statements[-1]
+        cur.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {body}', vars)
+        return cur.fetchone()[0][0]
+    finally:
+        cur.close()
+        conn.rollback()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--min-rows', type=int, default=1000, help='seq scans of smaller tables are reported, not failed')
+    parser.add_argument('--max-buffers', type=int, default=1000, help='an index scan that reads this many pages is a miss too')
+    parser.add_argument('--verbose', action='store_true', help='print full plans of failing statements')
+    args = parser.parse_args()
+    
+    global _recording
+    url = os.environ['DATABASE_URL']
+    db._connect = lambda: psycopg2.connect(url, cursor_factory=RecordingCursor)
+    
+    conn = psycopg2.connect(url)
+    cur = conn.cursor()
+    ids = sample(cur)
+    if not ids:
+        print('database needs users, messages, private messages and subscriptions - seed it first')
+        sys.exit(2)
+    cur.execute('SELECT relname, reltuples FROM pg_class WHERE relkind = %s', ('r',))
+    table_rows = {name: rows for name, rows in cur.fetchall()}
+    cur.close()
+    conn.close()
+    
+    handlers: Dict[str, Callable] = {}
+    failures: List[str] = []
+    
+    for name, method, query, body, headers in scenarios(ids):
+        if name not in handlers:
+            handlers[name] = load_handler_module(name).handler
+        event = {'httpMethod': method, 'headers': headers, 'queryStringParameters': query}
+        if body is not None:
+            event['body'] = json.dumps(body)
+    
+        _captured.clear()
+        _recording = True
+        try:
+            status = handlers[name](event, None).get('statusCode')
+        finally:
+            _recording = False
+        print(f'{name} {method} -> {status}')
+    
+        for connection, statement, vars in list(_captured):
+            statements = split_statements(statement, vars)
+            keyword = statements[-1][0].split(None, 1)[0].upper() if statements else ''
+            if keyword not in EXPLAINABLE or connection.closed:
+                continue
+            summary = ' '.join(statements[-1][0].split())[:90]
+            try:
+                plan = explain(connection, statements)
+            except psycopg2.Error as e:
+                print(f'    skip  {summary} ({str(e).strip().splitlines()[0]})')
+                continue
+    
+            root = plan['Plan']
+            buffers = root.get('Shared Hit Blocks', 0) + root.get('Shared Read Blocks', 0)
+            big = [t for t in seq_scans(root) if table_rows.get(t, 0) >= args.min_rows]
+            small = [t for t in seq_scans(root) if t not in big]
+            verdict = 'SEQ' if big else 'BUF' if buffers > args.max_buffers else 'ok'
+            print(f'    {verdict:<5} {plan["Execution Time"]:>8.2f} ms {buffers:>7} buf  {summary}')
+            if small:
+                print(f'          seq scan of small table(s): {", ".join(sorted(set(small)))}')
+            if big:
+                failures.append(f'{name} {method}: seq scan on {", ".join(sorted(set(big)))} in {summary}')
+            elif buffers > args.max_buffers:
+                failures.append(f'{name} {method}: {buffers} buffers in {summary}')
+            if verdict != 'ok' and args.verbose:
+                print(json.dumps(root, indent=2))
+    
+    if failures:
+        print(f'\n{len(failures)} hot-path statement(s) miss an index:')
+        for failure in failures:
+            print(f'  {failure}')
+        sys.exit(1)
+    print('\nno sequential scans or oversized reads on hot paths')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+'''
+Business: Seed a local database with synthetic users, chat history and social graph through COPY
+Args: DATABASE_URL; --users, --messages, --private-messages, --reactions, --photos, --subscriptions, --blacklist, --days, --seed, --truncate
+Returns: prints rows written per table and seconds spent; every seeded user logs in with password "password"
+'''
+
+import argparse
+import io
+import itertools
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Iterable, List, Sequence, Tuple
+
+import psycopg2
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from _common.passwords import hash_password
+
+SCHEMA = 't_p53416936_auxchat_energy_messa'
+PASSWORD = 'password'
+COPY_CHUNK = 50000
+EMOJIS = ['👍', '❤️', '😂', '🔥', '😮', '😢']
+WORDS = (
+    'привет как дела что нового энергия чат сегодня завтра вечером встретимся отлично спасибо '
+    'давай посмотрим фото классно согласен думаю может быть конечно нет да ок супер пока'
+).split()
+PARTNER_OFFSETS = [1, 7, 31, 127, 509]
+
+SEEDED_TABLES = [
+    'message_reaction_counts', 'message_reactions', 'conversations', 'private_messages', 'user_photos',
+    'subscriptions', 'blacklist', 'feed_inbox', 'user_presence', 'energy_ledger', 'messages', 'users'
+]
+
+
+def sentence(rng: random.Random, low: int = 2, high: int = 14) -> str:
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high)))
+
+
+def timestamps(rng: random.Random, count: int, days: int) -> List[datetime]:
+    '''Sorted ascending so serial ids follow created_at, as they do in production'''
+    now = datetime.now()
+    span = days * 86400
+    return sorted(now - timedelta(seconds=rng.random() * span) for _ in range(count))
+
+
+def copy_rows(cur: Any, table: str, columns: Sequence[str], rows: Iterable[tuple]) -> int:
+    '''COPY rows in chunks; values are generated without tabs, newlines or backslashes'''
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    written = 0
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, COPY_CHUNK))
+        if not chunk:
+            return written
+        buffer = io.StringIO()
+        for row in chunk:
+            buffer.write('\t'.join('\\N' if value is None else str(value) for value in row))
+            buffer.write('\n')
+        buffer.seek(0)
+        cur.copy_expert(sql, buffer)
+        written += len(chunk)
+
+
+def skewed_picker(rng: random.Random, population: Sequence[int], exponent: float = 0.9):
+    '''Zipf-like choice: a few very active users, a long quiet tail'''
+    weights = list(itertools.accumulate(1.0 / (rank + 1) ** exponent for rank in range(len(population))))
+    return lambda k: rng.choices(population, cum_weights=weights, k=k)
+
+
+def new_ids(cur: Any, table: str, after_id: int) -> List[int]:
+    cur.execute(f'SELECT id FROM {table} WHERE id > %s ORDER BY id', (after_id,))
+    return [row[0] for row in cur.fetchall()]
+
+
+def max_id(cur: Any, table: str) -> int:
+    cur.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}')
+    return cur.fetchone()[0]
+
+
+def seed_users(cur: Any, rng: random.Random, count: int, days: int) -> List[int]:
+    before = max_id(cur, f'{SCHEMA}.users')
+    password_hash = hash_password(PASSWORD)
+    created = timestamps(rng, count, days)
+    copy_rows(cur, f'{SCHEMA}.users', ('phone', 'username', 'password_hash', 'energy', 'bio', 'created_at', 'last_activity'), (
+        (f'+7990{before + i:07d}', f'user{before + i}', password_hash, 10000,
+         sentence(rng, 5, 40) if rng.random() < 0.3 else None, created[i], created[i])
+        for i in range(count)
+    ))
+    ids = new_ids(cur, f'{SCHEMA}.users', before)
+    # Стартовый баланс в журнале, как у зарегистрированных через register
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.energy_ledger (user_id, amount, reason, materialized)
+        SELECT id, energy, 'signup', TRUE FROM {SCHEMA}.users WHERE id > %s
+    """, (before,))
+    return ids
+
+
+def seed_messages(cur: Any, rng: random.Random, authors, count: int, days: int) -> List[int]:
+    before = max_id(cur, f'{SCHEMA}.messages')
+    created = timestamps(rng, count, days)
+    picked = authors(count)
+    copy_rows(cur, f'{SCHEMA}.messages', ('user_id', 'text', 'created_at'), (
+        (picked[i], sentence(rng), created[i]) for i in range(count)
+    ))
+    return new_ids(cur, f'{SCHEMA}.messages', before)
+
+
+def seed_private_messages(cur: Any, rng: random.Random, users: List[int], authors, count: int, days: int) -> int:
+    # У каждого пользователя несколько постоянных собеседников, активные пишут больше
+    position = {user_id: i for i, user_id in enumerate(users)}
+    created = timestamps(rng, count, days)
+    unread_after = datetime.now() - timedelta(hours=6)
+    senders = authors(count)
+    rows = []
+    for i in range(count):
+        sender = senders[i]
+        receiver = users[(position[sender] + rng.choice(PARTNER_OFFSETS)) % len(users)]
+        if receiver == sender:
+            continue
+        is_read = created[i] < unread_after or rng.random() < 0.5
+        rows.append((sender, receiver, sentence(rng), is_read, created[i]))
+    return copy_rows(cur, f'{SCHEMA}.private_messages', ('sender_id', 'receiver_id', 'text', 'is_read', 'created_at'), rows)
+
+
+def seed_reactions(cur: Any, rng: random.Random, messages: List[int], reactors, count: int) -> int:
+    # Свежие сообщения собирают больше реакций
+    recent_first = skewed_picker(rng, messages[::-1], 0.6)
+    seen = set()
+    for message_id, user_id in zip(recent_first(count), reactors(count)):
+        seen.add((message_id, user_id, rng.choice(EMOJIS)))
+    written = copy_rows(cur, f'{SCHEMA}.message_reactions', ('message_id', 'user_id', 'emoji'), seen)
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.message_reaction_counts (message_id, emoji, count)
+        SELECT message_id, emoji, COUNT(*) FROM {SCHEMA}.message_reactions GROUP BY message_id, emoji
+        ON CONFLICT (message_id, emoji) DO UPDATE SET count = EXCLUDED.count
+    """)
+    return written
+
+
+def seed_photos(cur: Any, rng: random.Random, users: List[int], count: int, days: int) -> int:
+    rows, per_user = [], {}
+    for user_id in rng.choices(users, k=count):
+        order = per_user.get(user_id, 0)
+        if order >= 6:
+            continue
+        per_user[user_id] = order + 1
+        rows.append((user_id, f'https://cdn.poehali.dev/seed/{user_id}/{order}.jpg', 0 if order == 0 else 999,
+                     datetime.now() - timedelta(seconds=rng.random() * days * 86400)))
+    return copy_rows(cur, f'{SCHEMA}.user_photos', ('user_id', 'photo_url', 'display_order', 'created_at'), rows)
+
+
+def seed_pairs(cur: Any, table: str, columns: Tuple[str, str], left: List[int], right: List[int]) -> int:
+    pairs = {(a, b) for a, b in zip(left, right) if a != b}
+    cur.execute(f'SELECT {columns[0]}, {columns[1]} FROM {table}')
+    pairs.difference_update(cur.fetchall())
+    return copy_rows(cur, table, columns, pairs)
+
+
+def rebuild_conversations(cur: Any) -> None:
+    '''Same summary private-messages maintains on write, rebuilt from scratch'''
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.conversations
+            (user_low, user_high, last_message_id, last_message_text, last_message_at, unread_low, unread_high)
+        SELECT lm.user_low, lm.user_high, lm.id, lm.text, lm.created_at, uc.unread_low, uc.unread_high
+        FROM (
+            SELECT DISTINCT ON (LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id))
+                LEAST(sender_id, receiver_id) AS user_low,
+                GREATEST(sender_id, receiver_id) AS user_high,
+                id, text, created_at
+            FROM {SCHEMA}.private_messages
+            ORDER BY LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id), created_at DESC, id DESC
+        ) lm
+        JOIN (
+            SELECT
+                LEAST(sender_id, receiver_id) AS user_low,
+                GREATEST(sender_id, receiver_id) AS user_high,
+                COUNT(*) FILTER (WHERE is_read = FALSE AND receiver_id = LEAST(sender_id, receiver_id)) AS unread_low,
+                COUNT(*) FILTER (WHERE is_read = FALSE AND receiver_id = GREATEST(sender_id, receiver_id)) AS unread_high
+            FROM {SCHEMA}.private_messages
+            GROUP BY LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id)
+        ) uc ON uc.user_low = lm.user_low AND uc.user_high = lm.user_high
+        ON CONFLICT (user_low, user_high) DO UPDATE SET
+            last_message_id = EXCLUDED.last_message_id,
+            last_message_text = EXCLUDED.last_message_text,
+            last_message_at = EXCLUDED.last_message_at,
+            unread_low = EXCLUDED.unread_low,
+            unread_high = EXCLUDED.unread_high
+    """)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--private-messages', type=int, default=300000)
+    parser.add_argument('--reactions', type=int, default=100000)
+    parser.add_argument('--photos', type=int, default=15000)
+    parser.add_argument('--subscriptions', type=int, default=50000)
+    parser.add_argument('--blacklist', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=90, help='history spread over this many days')
+    parser.add_argument('--seed', type=int, default=1, help='random seed; the same seed gives the same data')
+    parser.add_argument('--truncate', action='store_true', help='empty the seeded tables and tables referencing them first (local databases only)')
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    started = time.perf_counter()
+    
+    if args.truncate:
+        cur.execute(f"TRUNCATE {', '.join(f'{SCHEMA}.{t}' for t in SEEDED_TABLES)} RESTART IDENTITY CASCADE")
+
+    def step(name: str, action) -> Any:
+        step_started = time.perf_counter()
+        result = action()
+        written = len(result) if isinstance(result, list) else result
+        print(f'{name:>18}: {written:>9} rows in {time.perf_counter() - step_started:6.2f} s')
+        return result
+    
+    users = step('users', lambda: seed_users(cur, rng, args.users, args.days))
+    authors = skewed_picker(rng, rng.sample(users, len(users)))
+    messages = step('messages', lambda: seed_messages(cur, rng, authors, args.messages, args.days))
+    step('private_messages', lambda: seed_private_messages(cur, rng, users, authors, args.private_messages, args.days))
+    step('conversations', lambda: rebuild_conversations(cur) or cur.rowcount)
+    step('reactions', lambda: seed_reactions(cur, rng, messages, authors, args.reactions))
+    step('photos', lambda: seed_photos(cur, rng, users, args.photos, args.days))
+    # Подписываются все, но на популярных авторов — чаще
+    step('subscriptions', lambda: seed_pairs(
+        cur, f'{SCHEMA}.subscriptions', ('subscriber_id', 'subscribed_to_id'),
+        rng.choices(users, k=args.subscriptions), authors(args.subscriptions)
+    ))
+    step('blacklist', lambda: seed_pairs(
+        cur, f'{SCHEMA}.blacklist', ('user_id', 'blocked_user_id'),
+        rng.choices(users, k=args.blacklist), rng.choices(users, k=args.blacklist)
+    ))
+    
+    conn.commit()
+    conn.autocommit = True
+    # После COPY карта видимости пуста: без VACUUM index-only scan ленты ходит в кучу за каждой строкой
+    cur.execute('VACUUM ANALYZE')
+    cur.close()
+    conn.close()
+    print(f'done in {time.perf_counter() - started:.1f} s; log in with any seeded phone and password "{PASSWORD}"')
+
+
+if __name__ == '__main__':
+    main()
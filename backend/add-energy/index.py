@@ -5,9 +5,9 @@ Returns: HTTP response with new energy balance
 '''
 
 import json
-import os
-import psycopg2
 from typing import Dict, Any
+from _common.db import get_conn, put_conn
+from _common.energy import credit, current_balance, materialize_if_due
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -42,23 +42,22 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'user_id and positive amount are required'})
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = get_conn()
     cur = conn.cursor()
     
-    cur.execute(
-        "UPDATE t_p53416936_auxchat_energy_messa.users SET energy = energy + %s WHERE id = %s RETURNING energy",
-        (amount, user_id)
-    )
-    result = cur.fetchone()
+    new_energy = current_balance(cur, user_id)
+    if new_energy is not None:
+        credit(cur, user_id, amount, 'top_up')
+        new_energy += amount
     
     conn.commit()
     cur.close()
-    conn.close()
+    materialize_if_due(conn)
+    put_conn(conn)
     
     return {
         'statusCode': 200,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
         'isBase64Encoded': False,
-        'body': json.dumps({'new_energy': result[0] if result else 0})
+        'body': json.dumps({'new_energy': new_energy or 0})
     }
@@ -1,14 +1,94 @@
 import json
-import os
-import psycopg2
-from typing import Dict, Any
+from collections import Counter
+from typing import Dict, Any, List, Tuple
+from _common.db import get_conn, put_conn
+
+MAX_EMOJI_LENGTH = 10
+MAX_BATCH_TOGGLES = 100
+
+# Переключение реакций и счётчики меняются одной командой: DELETE удаляет
+# существующие реакции, для остальных INSERT добавляет их, а дельты сразу
+# попадают в message_reaction_counts. Одиночный запрос — батч из одного элемента
+TOGGLE_QUERY = """
+    WITH t AS (
+        SELECT DISTINCT message_id, emoji
+        FROM unnest(%(message_ids)s::integer[], %(emojis)s::varchar[]) AS t(message_id, emoji)
+    ),
+    removed AS (
+        DELETE FROM t_p53416936_auxchat_energy_messa.message_reactions r
+        USING t
+        WHERE r.message_id = t.message_id AND r.emoji = t.emoji AND r.user_id = %(user_id)s
+        RETURNING r.message_id, r.emoji
+    ),
+    added AS (
+        INSERT INTO t_p53416936_auxchat_energy_messa.message_reactions (message_id, user_id, emoji)
+        SELECT t.message_id, %(user_id)s, t.emoji FROM t
+        WHERE NOT EXISTS (SELECT 1 FROM removed x WHERE x.message_id = t.message_id AND x.emoji = t.emoji)
+        ON CONFLICT (message_id, user_id, emoji) DO NOTHING
+        RETURNING message_id, emoji
+    ),
+    counted AS (
+        INSERT INTO t_p53416936_auxchat_energy_messa.message_reaction_counts AS c (message_id, emoji, count)
+        SELECT message_id, emoji, 1 FROM added
+        UNION ALL
+        SELECT message_id, emoji, -1 FROM removed
+        ON CONFLICT (message_id, emoji) DO UPDATE SET count = c.count + EXCLUDED.count
+        RETURNING message_id, emoji, count
+    )
+    SELECT t.message_id, t.emoji,
+           CASE WHEN a.message_id IS NOT NULL THEN 'added'
+                WHEN r.message_id IS NOT NULL THEN 'removed'
+                ELSE 'unchanged' END,
+           COALESCE(c.count, 0)
+    FROM t
+    LEFT JOIN added a ON a.message_id = t.message_id AND a.emoji = t.emoji
+    LEFT JOIN removed r ON r.message_id = t.message_id AND r.emoji = t.emoji
+    LEFT JOIN counted c ON c.message_id = t.message_id AND c.emoji = t.emoji
+"""
+
+COUNTS_QUERY = """
+    SELECT message_id, emoji, count
+    FROM t_p53416936_auxchat_energy_messa.message_reaction_counts
+    WHERE message_id = ANY(%s) AND count > 0
+    ORDER BY message_id, emoji
+"""
+
+def error_response(message: str) -> Dict[str, Any]:
+    return {
+        'statusCode': 400,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'error': message})
+    }
+
+def parse_toggles(body_data: Dict[str, Any]) -> Tuple[List[Tuple[int, str]], str]:
+    raw = body_data['toggles'] if 'toggles' in body_data else [body_data]
+    if not isinstance(raw, list) or not raw:
+        return [], 'toggles must be a non-empty list'
+    if len(raw) > MAX_BATCH_TOGGLES:
+        return [], f'At most {MAX_BATCH_TOGGLES} toggles per request'
+    
+    toggles = []
+    for item in raw:
+        if not isinstance(item, dict):
+            return [], 'User ID, message ID, and emoji required'
+        message_id = item.get('message_id')
+        emoji = str(item.get('emoji', '')).strip()
+        if not message_id or not emoji:
+            return [], 'User ID, message ID, and emoji required'
+        if len(emoji) > MAX_EMOJI_LENGTH:
+            return [], 'Emoji is too long'
+        try:
+            toggles.append((int(message_id), emoji))
+        except (TypeError, ValueError):
+            return [], 'Message ID must be an integer'
+    return toggles, ''
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
-    Business: Add reaction to message
-    Args: event with httpMethod, body (user_id, message_id, emoji)
+    Business: Toggle reactions on messages - one toggle or a batch in one transaction
+    Args: event with httpMethod, body (user_id, message_id, emoji) or (user_id, toggles: [{message_id, emoji}])
           context with request_id
-    Returns: HTTP response with operation result
+    Returns: HTTP response with the toggle result and count, or per-toggle results and counts of touched messages
     '''
     method: str = event.get('httpMethod', 'GET')
     
@@ -33,45 +113,61 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     body_data = json.loads(event.get('body', '{}'))
     user_id = body_data.get('user_id')
-    message_id = body_data.get('message_id')
-    emoji = body_data.get('emoji', '').strip()
+    batch = 'toggles' in body_data
     
-    if not user_id or not message_id or not emoji:
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'User ID, message ID, and emoji required'})
-        }
+    if not user_id:
+        return error_response('User ID, message ID, and emoji required')
+    
+    toggles, error = parse_toggles(body_data)
+    if error:
+        return error_response(error)
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    # Быстрые повторные нажатия в одном батче гасят друг друга: применяем только нечётные
+    taps = Counter(toggles)
+    effective = [toggle for toggle in dict.fromkeys(toggles) if taps[toggle] % 2 == 1]
+    
+    conn = get_conn()
     cur = conn.cursor()
     
-    cur.execute(
-        "SELECT id FROM t_p53416936_auxchat_energy_messa.message_reactions WHERE message_id = %s AND user_id = %s AND emoji = %s",
-        (message_id, user_id, emoji)
-    )
-    existing = cur.fetchone()
+    results: Dict[Tuple[int, str], Tuple[str, int]] = {}
+    if effective:
+        cur.execute(TOGGLE_QUERY, {
+            'user_id': user_id,
+            'message_ids': [toggle[0] for toggle in effective],
+            'emojis': [toggle[1] for toggle in effective]
+        })
+        results = {(row[0], row[1]): (row[2], row[3]) for row in cur.fetchall()}
+    
+    if not batch:
+        conn.commit()
+        cur.close()
+        put_conn(conn)
+        action, count = results.get(toggles[0], ('unchanged', 0))
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'success': True, 'action': action, 'count': count})
+        }
     
-    if existing:
-        cur.execute(
-            "DELETE FROM t_p53416936_auxchat_energy_messa.message_reactions WHERE id = %s",
-            (existing[0],)
-        )
-        action = 'removed'
-    else:
-        cur.execute(
-            "INSERT INTO t_p53416936_auxchat_energy_messa.message_reactions (message_id, user_id, emoji) VALUES (%s, %s, %s)",
-            (message_id, user_id, emoji)
-        )
-        action = 'added'
+    message_ids = list(dict.fromkeys(toggle[0] for toggle in toggles))
+    cur.execute(COUNTS_QUERY, (message_ids,))
+    reactions: Dict[int, List[Dict[str, Any]]] = {message_id: [] for message_id in message_ids}
+    for message_id, emoji, count in cur.fetchall():
+        reactions[message_id].append({'emoji': emoji, 'count': count})
     
     conn.commit()
     cur.close()
-    conn.close()
+    put_conn(conn)
     
     return {
         'statusCode': 200,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'success': True, 'action': action})
+        'body': json.dumps({
+            'success': True,
+            'results': [
+                {'message_id': toggle[0], 'emoji': toggle[1], 'action': results.get(toggle, ('unchanged', 0))[0]}
+                for toggle in dict.fromkeys(toggles)
+            ],
+            'messages': [{'id': message_id, 'reactions': reactions[message_id]} for message_id in message_ids]
+        })
     }
@@ -1,7 +1,8 @@
 import json
 import os
-import psycopg2
 from typing import Dict, Any
+from _common.db import get_conn, put_conn
+from _common.energy import BALANCE_SQL, credit
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -24,15 +25,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': ''
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = get_conn()
     cur = conn.cursor()
     
     if method == 'GET':
-        cur.execute("""
-            SELECT id, phone, username, avatar_url, energy, created_at, is_banned
-            FROM t_p53416936_auxchat_energy_messa.users
-            ORDER BY created_at DESC
+        cur.execute(f"""
+            SELECT u.id, u.phone, u.username, u.avatar_url, {BALANCE_SQL}, u.created_at, u.is_banned
+            FROM t_p53416936_auxchat_energy_messa.users u
+            ORDER BY u.created_at DESC
         """)
         
         users = []
@@ -49,7 +49,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             })
         
         cur.close()
-        conn.close()
+        put_conn(conn)
         
         return {
             'statusCode': 200,
@@ -59,7 +59,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     if method != 'POST':
         cur.close()
-        conn.close()
+        put_conn(conn)
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -75,7 +75,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     if not admin_secret or admin_secret != expected_secret:
         cur.close()
-        conn.close()
+        put_conn(conn)
         return {
             'statusCode': 403,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -84,30 +84,40 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     if action == 'add_energy':
         amount = body_data.get('amount', 0)
-        cur.execute("UPDATE t_p53416936_auxchat_energy_messa.users SET energy = energy + %s WHERE id = %s", (amount, target_user_id))
+        credit(cur, target_user_id, amount, 'admin')
         conn.commit()
         result = {'message': f"Added {amount} energy", 'success': True}
         
     elif action == 'ban':
-        cur.execute("UPDATE t_p53416936_auxchat_energy_messa.users SET is_banned = TRUE WHERE id = %s", (target_user_id,))
+        cur.execute("UPDATE t_p53416936_auxchat_energy_messa.users SET is_banned = TRUE, profile_version = profile_version + 1 WHERE id = %s", (target_user_id,))
         conn.commit()
         result = {'message': 'User banned', 'success': True}
         
     elif action == 'unban':
-        cur.execute("UPDATE t_p53416936_auxchat_energy_messa.users SET is_banned = FALSE WHERE id = %s", (target_user_id,))
+        cur.execute("UPDATE t_p53416936_auxchat_energy_messa.users SET is_banned = FALSE, profile_version = profile_version + 1 WHERE id = %s", (target_user_id,))
         conn.commit()
         result = {'message': 'User unbanned', 'success': True}
         
     elif action == 'delete':
         cur.execute("DELETE FROM t_p53416936_auxchat_energy_messa.messages WHERE user_id = %s", (target_user_id,))
-        cur.execute("DELETE FROM t_p53416936_auxchat_energy_messa.message_reactions WHERE user_id = %s", (target_user_id,))
+        cur.execute("""
+            WITH removed AS (
+                DELETE FROM t_p53416936_auxchat_energy_messa.message_reactions WHERE user_id = %s
+                RETURNING message_id, emoji
+            )
+            UPDATE t_p53416936_auxchat_energy_messa.message_reaction_counts c
+            SET count = c.count - r.removed
+            FROM (SELECT message_id, emoji, COUNT(*) AS removed FROM removed GROUP BY message_id, emoji) r
+            WHERE c.message_id = r.message_id AND c.emoji = r.emoji
+        """, (target_user_id,))
+        cur.execute("DELETE FROM t_p53416936_auxchat_energy_messa.energy_ledger WHERE user_id = %s", (target_user_id,))
         cur.execute("DELETE FROM t_p53416936_auxchat_energy_messa.users WHERE id = %s", (target_user_id,))
         conn.commit()
         result = {'message': 'User deleted', 'success': True}
         
     else:
         cur.close()
-        conn.close()
+        put_conn(conn)
         return {
             'statusCode': 400,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -115,7 +125,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     cur.close()
-    conn.close()
+    put_conn(conn)
     
     return {
         'statusCode': 200,
@@ -5,9 +5,9 @@ Args: event - dict with httpMethod, queryStringParameters, headers
 Returns: HTTP response dict with blocked users list or action result
 """
 import json
-import os
-import psycopg2
 from typing import Dict, Any
+from _common.db import get_conn, put_conn
+from _common.auth import authenticate
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -19,24 +19,24 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Session-Token, Authorization',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
         }
     
-    headers = event.get('headers', {})
-    user_id = headers.get('X-User-Id') or headers.get('x-user-id')
+    session = authenticate(event)
     
-    if not user_id:
+    if not session:
         return {
             'statusCode': 401,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': 'Unauthorized'})
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    user_id = session.user_id
+    
+    conn = get_conn()
     
     try:
         if method == 'GET':
@@ -127,4 +127,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             }
     
     finally:
-        conn.close()
+        put_conn(conn)
@@ -1,7 +1,7 @@
 import json
-import os
-import psycopg2
 from typing import Dict, Any
+from _common.db import get_conn, put_conn
+from _common.energy import record_opening_balance
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -43,8 +43,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Phone and username required'})
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = get_conn()
     cur = conn.cursor()
     
     cur.execute("SELECT id FROM t_p53416936_auxchat_energy_messa.users WHERE phone = %s", (phone,))
@@ -52,7 +51,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     if existing:
         cur.close()
-        conn.close()
+        put_conn(conn)
         return {
             'statusCode': 400,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -64,10 +63,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         (phone, username, avatar)
     )
     user_id = cur.fetchone()[0]
+    record_opening_balance(cur, user_id)
     
     conn.commit()
     cur.close()
-    conn.close()
+    put_conn(conn)
     
     return {
         'statusCode': 200,
@@ -5,10 +5,10 @@ Returns: HTTP response with conversations list
 '''
 
 import json
-import os
-import psycopg2
 from typing import Dict, Any
-from datetime import datetime, timedelta
+from _common.db import get_conn, put_conn
+from _common.presence import is_online
+from _common.auth import authenticate
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -19,7 +19,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Session-Token, Authorization',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -32,73 +32,56 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Method not allowed'})
         }
     
-    headers = event.get('headers', {})
-    user_id_str = headers.get('X-User-Id') or headers.get('x-user-id')
+    session = authenticate(event)
     
-    if not user_id_str:
+    if not session:
         return {
             'statusCode': 401,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': 'X-User-Id header required'})
         }
     
-    user_id = int(user_id_str)
-    dsn = os.environ.get('DATABASE_URL')
+    user_id = session.user_id
     
-    conn = psycopg2.connect(dsn)
+    conn = get_conn()
     cur = conn.cursor()
     
+    # Сводка диалогов поддерживается private-messages, поэтому здесь не нужно
+    # сканировать всю историю личных сообщений пользователя
     cur.execute("""
-        WITH last_messages AS (
-            SELECT 
-                CASE WHEN sender_id = %s THEN receiver_id ELSE sender_id END as other_user_id,
-                text as last_message,
-                created_at,
-                ROW_NUMBER() OVER (PARTITION BY 
-                    CASE WHEN sender_id = %s THEN receiver_id ELSE sender_id END 
-                    ORDER BY created_at DESC) as rn
-            FROM t_p53416936_auxchat_energy_messa.private_messages
-            WHERE sender_id = %s OR receiver_id = %s
-        ),
-        unread_counts AS (
-            SELECT receiver_id, sender_id, COUNT(*) as unread_count
-            FROM t_p53416936_auxchat_energy_messa.private_messages
-            WHERE receiver_id = %s AND is_read = FALSE
-            GROUP BY receiver_id, sender_id
-        )
         SELECT 
-            u.id, u.username, u.avatar_url, u.last_activity,
-            lm.last_message, lm.created_at,
-            COALESCE(uc.unread_count, 0) as unread_count
-        FROM last_messages lm
-        JOIN t_p53416936_auxchat_energy_messa.users u ON u.id = lm.other_user_id
-        LEFT JOIN unread_counts uc ON uc.sender_id = u.id
-        WHERE lm.rn = 1
-        ORDER BY lm.created_at DESC
-    """, (user_id, user_id, user_id, user_id, user_id))
+            u.id, u.username, u.avatar_url, GREATEST(u.last_activity, p.last_seen),
+            c.last_message_text, c.last_message_at, c.unread_count
+        FROM (
+            SELECT user_high AS other_user_id, last_message_text, last_message_at, unread_low AS unread_count
+            FROM t_p53416936_auxchat_energy_messa.conversations
+            WHERE user_low = %s
+            UNION ALL
+            SELECT user_low AS other_user_id, last_message_text, last_message_at, unread_high AS unread_count
+            FROM t_p53416936_auxchat_energy_messa.conversations
+            WHERE user_high = %s
+        ) c
+        JOIN t_p53416936_auxchat_energy_messa.users u ON u.id = c.other_user_id
+        LEFT JOIN t_p53416936_auxchat_energy_messa.user_presence p ON p.user_id = u.id
+        ORDER BY c.last_message_at DESC
+    """, (user_id, user_id))
     
     rows = cur.fetchall()
     
     conversations = []
     for row in rows:
-        last_activity = row[3]
-        is_online = False
-        if last_activity:
-            time_diff = datetime.utcnow() - last_activity
-            is_online = time_diff < timedelta(minutes=5)
-        
         conversations.append({
             'userId': row[0],
             'username': row[1],
             'avatarUrl': row[2],
-            'status': 'online' if is_online else 'offline',
+            'status': 'online' if is_online(row[3]) else 'offline',
             'lastMessage': row[4],
             'lastMessageAt': row[5].isoformat(),
             'unreadCount': row[6]
         })
     
     cur.close()
-    conn.close()
+    put_conn(conn)
     
     return {
         'statusCode': 200,
@@ -0,0 +1,79 @@
+'''
+Business: Feed of messages from followed users with keyset pagination
+Args: event with httpMethod, headers (X-Session-Token or X-User-Id), queryStringParameters (limit, before cursor)
+Returns: HTTP response with messages (same shape as get-messages) and nextCursor for older pages
+'''
+
+import json
+from typing import Dict, Any
+from _common.db import get_conn, put_conn
+from _common.auth import authenticate
+from _common.feed import MAX_LIMIT, page_query, use_inbox
+from _common.messages import HYDRATED_MESSAGES_QUERY, decode_cursor, encode_cursor, serialize_message
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Session-Token, Authorization',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+    
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Method not allowed'})
+        }
+    
+    session = authenticate(event)
+    
+    if not session:
+        return {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Unauthorized'})
+        }
+    
+    params = event.get('queryStringParameters') or {}
+    limit = min(max(int(params.get('limit', 20)), 1), MAX_LIMIT)
+    before = params.get('before')
+    
+    cursor = None
+    if before:
+        cursor = decode_cursor(before)
+        if not cursor:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Invalid cursor'})
+            }
+    
+    conn = get_conn()
+    cur = conn.cursor()
+    
+    inbox = use_inbox(cur, session.user_id)
+    page, page_params = page_query(session.user_id, cursor, limit, inbox)
+    cur.execute(HYDRATED_MESSAGES_QUERY.format(page=page), page_params)
+    rows = cur.fetchall()
+    
+    cur.close()
+    put_conn(conn)
+    
+    next_cursor = encode_cursor(rows[-1][2], rows[-1][0]) if len(rows) == limit else None
+    messages = [serialize_message(row) for row in rows]
+    messages.reverse()
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'isBase64Encoded': False,
+        'body': json.dumps({'messages': messages, 'nextCursor': next_cursor})
+    }
@@ -1,14 +1,15 @@
 import json
-import os
-import psycopg2
 from typing import Dict, Any
+from _common.db import get_conn, put_conn
+from _common.presence import get_store, is_online
+from _common.profiles import current_state, etag, get_cache, not_modified
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Get user data by ID
     Args: event with httpMethod, queryStringParameters (user_id)
           context with request_id
-    Returns: HTTP response with user data
+    Returns: HTTP response with user data and photos, 304 if If-None-Match matches the ETag
     '''
     method: str = event.get('httpMethod', 'GET')
     
@@ -18,7 +19,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -34,53 +35,49 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     params = event.get('queryStringParameters') or {}
     user_id = params.get('user_id')
     
-    if not user_id:
+    if not user_id or not str(user_id).isdigit():
         return {
             'statusCode': 400,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': 'User ID required'})
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    # Баланс меняется при каждой отправке и оплате в других функциях — в кеш он не входит.
+    # Тем же запросом читаем версию профиля: копия из кеша годится, только если версия совпала
+    conn = get_conn()
     cur = conn.cursor()
-    
-    cur.execute(
-        "SELECT id, phone, username, avatar_url, energy, is_banned, bio, last_activity FROM t_p53416936_auxchat_energy_messa.users WHERE id = %s",
-        (user_id,)
-    )
-    row = cur.fetchone()
-    
+    state = current_state(cur, int(user_id))
     cur.close()
-    conn.close()
+    put_conn(conn)
     
-    if not row:
+    profile = get_cache().get(int(user_id), version=state[1]) if state else None
+    
+    if not profile:
         return {
             'statusCode': 404,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': 'User not found'})
         }
     
-    # Проверяем активность (онлайн если был активен менее 5 минут назад)
-    from datetime import datetime, timedelta
-    last_activity = row[7]
-    is_online = False
-    if last_activity:
-        time_diff = datetime.utcnow() - last_activity
-        is_online = time_diff < timedelta(minutes=5)
+    # Статус онлайн берём из кеша присутствия: он меняется чаще, чем профиль
+    last_seen = get_store().lookup([profile['id']]).get(profile['id'])
+    body = json.dumps(dict(profile, energy=state[0], status='online' if is_online(last_seen) else 'offline'))
+    tag = etag(body)
+    
+    if not_modified(event, tag):
+        return {
+            'statusCode': 304,
+            'headers': {'ETag': tag, 'Access-Control-Allow-Origin': '*', 'Access-Control-Expose-Headers': 'ETag'},
+            'body': ''
+        }
     
     return {
         'statusCode': 200,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({
-            'id': row[0],
-            'phone': row[1],
-            'username': row[2],
-            'avatar': row[3] if row[3] else '',
-            'energy': row[4],
-            'is_admin': False,
-            'is_banned': row[5] if row[5] is not None else False,
-            'bio': row[6] if row[6] else '',
-            'status': 'online' if is_online else 'offline'
-        })
-    }
\ No newline at end of file
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'ETag',
+            'ETag': tag
+        },
+        'body': body
+    }
@@ -0,0 +1,104 @@
+'''
+Business: Batch user lookup for rendering lists - profile, primary photo and online status in one query
+Args: event with httpMethod, queryStringParameters (ids - comma separated user ids, up to 300)
+Returns: HTTP response with public profile fields of every known user in request order
+'''
+
+import json
+from typing import Dict, Any
+from _common.db import get_conn, put_conn
+from _common.presence import is_online
+
+MAX_IDS = 300
+# Для списков достаточно начала «о себе», полный текст отдаёт get-user
+BIO_PREVIEW_LENGTH = 160
+
+USERS_QUERY = """
+    SELECT u.id, u.username, u.avatar_url, LEFT(u.bio, %s), u.is_banned,
+           ph.photo_url, GREATEST(u.last_activity, p.last_seen)
+    FROM t_p53416936_auxchat_energy_messa.users u
+    LEFT JOIN t_p53416936_auxchat_energy_messa.user_presence p ON p.user_id = u.id
+    LEFT JOIN LATERAL (
+        SELECT photo_url FROM t_p53416936_auxchat_energy_messa.user_photos
+        WHERE user_id = u.id
+        ORDER BY display_order ASC, created_at DESC
+        LIMIT 1
+    ) ph ON TRUE
+    WHERE u.id = ANY(%s)
+"""
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+    
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Method not allowed'})
+        }
+    
+    params = event.get('queryStringParameters') or {}
+    ids_param = params.get('ids', '')
+    
+    try:
+        user_ids = list(dict.fromkeys(int(part) for part in ids_param.split(',') if part.strip()))
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'ids must be comma separated integers'})
+        }
+    
+    if not user_ids:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'ids required'})
+        }
+    
+    if len(user_ids) > MAX_IDS:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': f'At most {MAX_IDS} ids per request'})
+        }
+    
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(USERS_QUERY, (BIO_PREVIEW_LENGTH, user_ids))
+    rows = {row[0]: row for row in cur.fetchall()}
+    cur.close()
+    put_conn(conn)
+    
+    users = []
+    for user_id in user_ids:
+        row = rows.get(user_id)
+        if not row:
+            continue
+        users.append({
+            'id': row[0],
+            'username': row[1],
+            'avatar': row[2] if row[2] else '',
+            'bio': row[3] if row[3] else '',
+            'is_banned': row[4] if row[4] is not None else False,
+            'photoUrl': row[5],
+            'status': 'online' if is_online(row[6]) else 'offline'
+        })
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Cache-Control': 'max-age=15'},
+        'body': json.dumps({'users': users})
+    }
@@ -1,8 +1,10 @@
 import json
-import os
-import psycopg2
-import hashlib
 from typing import Dict, Any
+from _common.db import get_conn, put_conn
+from _common.auth import issue_token
+from _common.ratelimit import client_ip, get_limiter, too_many_requests
+from _common.energy import BALANCE_SQL
+from _common.passwords import hash_password, needs_rehash, verify_password
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -43,19 +45,25 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Phone and password required'})
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    # Подбор пароля упирается в лимит раньше, чем в проверку scrypt
+    limiter = get_limiter()
+    for policy, identity in (('login:phone', phone), ('login:ip', client_ip(event))):
+        allowed, retry_after = limiter.allow(policy, identity)
+        if not allowed:
+            return too_many_requests(retry_after)
+    
+    conn = get_conn()
     cur = conn.cursor()
     
     cur.execute(
-        "SELECT id, username, avatar_url, password_hash, is_banned, is_admin, energy FROM t_p53416936_auxchat_energy_messa.users WHERE phone = %s",
+        f"SELECT u.id, u.username, u.avatar_url, u.password_hash, u.is_banned, u.is_admin, {BALANCE_SQL} FROM t_p53416936_auxchat_energy_messa.users u WHERE u.phone = %s",
         (phone,)
     )
     result = cur.fetchone()
     
     if not result:
         cur.close()
-        conn.close()
+        put_conn(conn)
         return {
             'statusCode': 401,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -66,18 +74,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     if not password_hash:
         cur.close()
-        conn.close()
+        put_conn(conn)
         return {
             'statusCode': 401,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': 'Password not set. Please use SMS recovery.'})
         }
     
-    input_hash = hashlib.sha256(password.encode()).hexdigest()
-    
-    if input_hash != password_hash:
+    if not verify_password(password, password_hash):
         cur.close()
-        conn.close()
+        put_conn(conn)
         return {
             'statusCode': 401,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -86,15 +92,23 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     if is_banned:
         cur.close()
-        conn.close()
+        put_conn(conn)
         return {
             'statusCode': 403,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': 'User is banned'})
         }
     
+    # Пароль известен только сейчас: заменяем устаревший SHA-256 или хеш со старой стоимостью
+    if needs_rehash(password_hash):
+        cur.execute(
+            "UPDATE t_p53416936_auxchat_energy_messa.users SET password_hash = %s WHERE id = %s AND password_hash = %s",
+            (hash_password(password), user_id, password_hash)
+        )
+        conn.commit()
+    
     cur.close()
-    conn.close()
+    put_conn(conn)
     
     return {
         'statusCode': 200,
@@ -106,6 +120,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'avatar': avatar if avatar else f'https://api.dicebear.com/7.x/avataaars/svg?seed={username}',
             'energy': energy,
             'is_admin': is_admin,
-            'is_banned': is_banned
+            'is_banned': is_banned,
+            'token': issue_token(user_id, is_admin, is_banned)
         })
     }
\ No newline at end of file
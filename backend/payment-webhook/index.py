@@ -5,9 +5,10 @@ Returns: HTTP 200 response
 '''
 
 import json
-import os
-import psycopg2
 from typing import Dict, Any
+from _common.db import get_conn, put_conn
+from _common.energy import materialize_if_due
+from _common.payments import apply_payment, parse_event
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -33,43 +34,36 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     body_data = json.loads(event.get('body', '{}'))
     
-    event_type = body_data.get('event')
-    if event_type != 'payment.succeeded':
+    payment, error = parse_event(body_data)
+    if error:
         return {
-            'statusCode': 200,
+            'statusCode': 400,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'status': 'ignored'})
+            'body': json.dumps({'error': error})
         }
     
-    payment_object = body_data.get('object', {})
-    metadata = payment_object.get('metadata', {})
-    
-    user_id = metadata.get('user_id')
-    energy_amount = metadata.get('energy_amount')
-    
-    if not user_id or not energy_amount:
+    if not payment:
         return {
-            'statusCode': 400,
+            'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Invalid metadata'})
+            'body': json.dumps({'status': 'ignored'})
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = get_conn()
     cur = conn.cursor()
     
-    cur.execute(
-        "UPDATE t_p53416936_auxchat_energy_messa.users SET energy = energy + %s WHERE id = %s",
-        (int(energy_amount), int(user_id))
-    )
+    # Повторная доставка того же платежа упирается в ON CONFLICT и ничего не начисляет
+    credited = apply_payment(cur, payment)
     
     conn.commit()
     cur.close()
-    conn.close()
+    if credited:
+        materialize_if_due(conn)
+    put_conn(conn)
     
     return {
         'statusCode': 200,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
         'isBase64Encoded': False,
-        'body': json.dumps({'status': 'ok'})
+        'body': json.dumps({'status': 'ok' if credited else 'duplicate'})
     }
@@ -0,0 +1,76 @@
+'''
+Business: Bulk online-status lookup for rendering user lists
+Args: event with httpMethod, queryStringParameters (ids - comma separated user ids, up to 300)
+Returns: HTTP response with status and last seen time for each known user
+'''
+
+import json
+from typing import Dict, Any
+from _common.presence import get_store, is_online, MAX_LOOKUP_IDS
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+    
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Method not allowed'})
+        }
+    
+    params = event.get('queryStringParameters') or {}
+    ids_param = params.get('ids', '')
+    
+    try:
+        user_ids = list(dict.fromkeys(int(part) for part in ids_param.split(',') if part.strip()))
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'ids must be comma separated integers'})
+        }
+    
+    if not user_ids:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'ids required'})
+        }
+    
+    if len(user_ids) > MAX_LOOKUP_IDS:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': f'At most {MAX_LOOKUP_IDS} ids per request'})
+        }
+    
+    last_seen_map = get_store().lookup(user_ids)
+    
+    presence = []
+    for user_id in user_ids:
+        if user_id not in last_seen_map:
+            continue
+        last_seen = last_seen_map[user_id]
+        presence.append({
+            'userId': user_id,
+            'status': 'online' if is_online(last_seen) else 'offline',
+            'lastSeen': last_seen.isoformat() if last_seen else None
+        })
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Cache-Control': 'max-age=15'},
+        'body': json.dumps({'presence': presence})
+    }
@@ -1,17 +1,92 @@
 '''
 Business: Send and receive private messages between users
-Args: event with httpMethod, headers (X-User-Id), body with receiverId/text, query params
+Args: event with httpMethod, headers (X-User-Id), body with receiverId/text, query params (otherUserId, sinceId)
 Returns: HTTP response with messages or send confirmation
 '''
 
 import json
-import os
-import psycopg2
 from typing import Dict, Any
+from _common.db import get_conn, put_conn
+from _common.presence import touch
+from _common.auth import authenticate
+from _common.queries import statement, execute
+
+# Опрос диалога идёт каждые несколько секунд, поэтому запросы подготавливаются
+# на соединении один раз и дальше выполняются без повторного планирования
+# Каждое направление диалога читается своей веткой по idx_private_messages_pair_created_at
+# и ограничивается до JOIN; из users нужны только два участника диалога.
+# Порядок created_at, id совпадает с индексом: sinceId отсекается в самом индексе,
+# а не сортировкой всей пары (id растут вместе с created_at)
+THREAD_SINCE = statement('pm_thread_since', ('integer', 'integer', 'integer'), """
+    SELECT pm.id, pm.sender_id, pm.receiver_id, pm.text, pm.is_read, pm.created_at,
+           u.username, NULL as avatar_url, pm.voice_url, pm.voice_duration
+    FROM (
+        (SELECT * FROM t_p53416936_auxchat_energy_messa.private_messages
+         WHERE sender_id = $1 AND receiver_id = $2 AND id > $3 ORDER BY created_at ASC, id ASC LIMIT 100)
+        UNION ALL
+        (SELECT * FROM t_p53416936_auxchat_energy_messa.private_messages
+         WHERE sender_id = $2 AND receiver_id = $1 AND id > $3 ORDER BY created_at ASC, id ASC LIMIT 100)
+        ORDER BY created_at ASC, id ASC
+        LIMIT 100
+    ) pm
+    JOIN (SELECT id, username FROM t_p53416936_auxchat_energy_messa.users WHERE id IN ($1, $2)) u ON u.id = pm.sender_id
+    ORDER BY pm.created_at ASC, pm.id ASC
+""")
+
+THREAD = statement('pm_thread', ('integer', 'integer'), """
+    SELECT pm.id, pm.sender_id, pm.receiver_id, pm.text, pm.is_read, pm.created_at,
+           u.username, NULL as avatar_url, pm.voice_url, pm.voice_duration
+    FROM (
+        (SELECT * FROM t_p53416936_auxchat_energy_messa.private_messages
+         WHERE sender_id = $1 AND receiver_id = $2 ORDER BY created_at ASC LIMIT 100)
+        UNION ALL
+        (SELECT * FROM t_p53416936_auxchat_energy_messa.private_messages
+         WHERE sender_id = $2 AND receiver_id = $1 ORDER BY created_at ASC LIMIT 100)
+        ORDER BY created_at ASC
+        LIMIT 100
+    ) pm
+    JOIN (SELECT id, username FROM t_p53416936_auxchat_energy_messa.users WHERE id IN ($1, $2)) u ON u.id = pm.sender_id
+    ORDER BY pm.created_at ASC
+""")
+
+# $3 = NULL отмечает прочитанным весь диалог, иначе только сообщения до id $3 включительно
+MARK_READ = statement('pm_mark_read', ('integer', 'integer', 'integer'), """
+    UPDATE t_p53416936_auxchat_energy_messa.private_messages 
+    SET is_read = TRUE 
+    WHERE receiver_id = $1 AND sender_id = $2 AND is_read = FALSE AND ($3 IS NULL OR id <= $3)
+""")
+
+DECREMENT_UNREAD = statement('pm_decrement_unread', ('integer', 'integer', 'integer'), """
+    UPDATE t_p53416936_auxchat_energy_messa.conversations
+    SET unread_low = CASE WHEN user_low = $1 THEN GREATEST(unread_low - $3, 0) ELSE unread_low END,
+        unread_high = CASE WHEN user_high = $1 THEN GREATEST(unread_high - $3, 0) ELSE unread_high END
+    WHERE user_low = LEAST($1, $2) AND user_high = GREATEST($1, $2)
+""")
+
+# Прочитанные сообщения всегда образуют префикс переписки (MARK_READ отмечает всё до id),
+# поэтому вместо MAX(id) по всей паре идём по индексу с конца до первого прочитанного
+READ_UP_TO = statement('pm_read_up_to', ('integer', 'integer'), """
+    SELECT id FROM t_p53416936_auxchat_energy_messa.private_messages
+    WHERE sender_id = $1 AND receiver_id = $2 AND is_read = TRUE
+    ORDER BY created_at DESC, id DESC
+    LIMIT 1
+""")
+
+IS_BLOCKED = statement('pm_is_blocked', ('integer', 'integer'), """
+    SELECT COUNT(*) FROM t_p53416936_auxchat_energy_messa.blacklist
+    WHERE (user_id = $1 AND blocked_user_id = $2)
+       OR (user_id = $2 AND blocked_user_id = $1)
+""")
+
+INSERT_MESSAGE = statement('pm_insert', ('integer', 'integer', 'text', 'text', 'integer'), """
+    INSERT INTO t_p53416936_auxchat_energy_messa.private_messages 
+    (sender_id, receiver_id, text, voice_url, voice_duration) 
+    VALUES ($1, $2, $3, $4, $5) 
+    RETURNING id
+""")
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     print(f'=== HANDLER START ===')
-    print(f'Event: {json.dumps(event)}')
     method: str = event.get('httpMethod', 'GET')
     print(f'Method: {method}')
     
@@ -21,7 +96,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Session-Token, Authorization',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -29,10 +104,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     try:
-        headers = event.get('headers', {})
-        user_id_str = headers.get('X-User-Id') or headers.get('x-user-id')
+        session = authenticate(event)
         
-        if not user_id_str:
+        if not session:
             return {
                 'statusCode': 401,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -40,12 +114,20 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'isBase64Encoded': False
             }
         
-        user_id = int(user_id_str)
+        user_id = session.user_id
+        
+        # Флаг бана берём из подписанного токена, без запроса к users
+        if method == 'POST' and session.is_banned:
+            return {
+                'statusCode': 403,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'User is banned'}),
+                'isBase64Encoded': False
+            }
         print(f'User ID: {user_id}')
-        dsn = os.environ.get('DATABASE_URL')
         print(f'Connecting to DB...')
         
-        conn = psycopg2.connect(dsn)
+        conn = get_conn()
         cur = conn.cursor()
         print(f'DB connected successfully')
         
@@ -55,7 +137,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             if not other_user_id_str:
                 cur.close()
-                conn.close()
+                put_conn(conn)
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -66,18 +148,15 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             other_user_id = int(other_user_id_str)
             print(f'Other user ID: {other_user_id}')
             
-            query = f"""
-                SELECT pm.id, pm.sender_id, pm.receiver_id, pm.text, pm.is_read, pm.created_at,
-                       u.username, NULL as avatar_url, pm.voice_url, pm.voice_duration
-                FROM t_p53416936_auxchat_energy_messa.private_messages pm
-                JOIN t_p53416936_auxchat_energy_messa.users u ON u.id = pm.sender_id
-                WHERE (pm.sender_id = {user_id} AND pm.receiver_id = {other_user_id}) 
-                   OR (pm.sender_id = {other_user_id} AND pm.receiver_id = {user_id})
-                ORDER BY pm.created_at ASC
-                LIMIT 100
-            """
+            since_id_str = query_params.get('sinceId')
+            since_id = int(since_id_str) if since_id_str else None
+            
             print(f'Executing query...')
-            cur.execute(query)
+            if since_id is not None:
+                # Инкрементальная синхронизация: только сообщения новее sinceId
+                execute(cur, THREAD_SINCE, (user_id, other_user_id, since_id))
+            else:
+                execute(cur, THREAD, (user_id, other_user_id))
             print(f'Query executed')
             
             rows = cur.fetchall()
@@ -105,21 +184,32 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             print(f'Prepared {len(messages)} messages for response')
             
-            update_query = f"""
-                UPDATE t_p53416936_auxchat_energy_messa.private_messages 
-                SET is_read = TRUE 
-                WHERE receiver_id = {user_id} AND sender_id = {other_user_id} AND is_read = FALSE
-            """
-            cur.execute(update_query)
-            conn.commit()
+            # Все входящие до sinceId уже были отмечены прочитанными при предыдущих
+            # опросах, поэтому UPDATE нужен только при новых непрочитанных и только
+            # для тех сообщений, которые клиент действительно получил
+            has_unread = any(row[2] == user_id and not row[4] for row in rows)
+            if since_id is None or has_unread:
+                read_limit = rows[-1][0] if since_id is not None else None
+                execute(cur, MARK_READ, (user_id, other_user_id, read_limit))
+                marked_read = cur.rowcount
+                if marked_read > 0:
+                    execute(cur, DECREMENT_UNREAD, (user_id, other_user_id, marked_read))
+                conn.commit()
+            
+            response_body = {'messages': messages}
+            if since_id is not None:
+                # Квитанция о прочтении: все наши сообщения с id <= readUpToId прочитаны
+                execute(cur, READ_UP_TO, (user_id, other_user_id))
+                read_row = cur.fetchone()
+                response_body['readUpToId'] = read_row[0] if read_row else None
             
             cur.close()
-            conn.close()
+            put_conn(conn)
             
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'messages': messages}),
+                'body': json.dumps(response_body),
                 'isBase64Encoded': False
             }
         
@@ -132,7 +222,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             if not receiver_id or (not text and not voice_url):
                 cur.close()
-                conn.close()
+                put_conn(conn)
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -141,17 +231,12 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 }
             
             # Проверяем блокировку в обе стороны
-            block_check_query = f"""
-                SELECT COUNT(*) FROM t_p53416936_auxchat_energy_messa.blacklist
-                WHERE (user_id = {user_id} AND blocked_user_id = {receiver_id})
-                   OR (user_id = {receiver_id} AND blocked_user_id = {user_id})
-            """
-            cur.execute(block_check_query)
+            execute(cur, IS_BLOCKED, (user_id, int(receiver_id)))
             is_blocked = cur.fetchone()[0] > 0
             
             if is_blocked:
                 cur.close()
-                conn.close()
+                put_conn(conn)
                 return {
                     'statusCode': 403,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -159,43 +244,42 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            if voice_url:
-                escaped_voice_url = voice_url.replace("'", "''")
-                if text:
-                    escaped_text = text.replace("'", "''")
-                    insert_query = f"""
-                        INSERT INTO t_p53416936_auxchat_energy_messa.private_messages 
-                        (sender_id, receiver_id, text, voice_url, voice_duration) 
-                        VALUES ({user_id}, {receiver_id}, '{escaped_text}', '{escaped_voice_url}', {voice_duration if voice_duration else 'NULL'}) 
-                        RETURNING id
-                    """
-                else:
-                    insert_query = f"""
-                        INSERT INTO t_p53416936_auxchat_energy_messa.private_messages 
-                        (sender_id, receiver_id, text, voice_url, voice_duration) 
-                        VALUES ({user_id}, {receiver_id}, '', '{escaped_voice_url}', {voice_duration if voice_duration else 'NULL'}) 
-                        RETURNING id
-                    """
-            else:
-                escaped_text = text.replace("'", "''")
-                insert_query = f"""
-                    INSERT INTO t_p53416936_auxchat_energy_messa.private_messages 
-                    (sender_id, receiver_id, text) 
-                    VALUES ({user_id}, {receiver_id}, '{escaped_text}') 
-                    RETURNING id
-                """
-            cur.execute(insert_query)
+            execute(cur, INSERT_MESSAGE, (
+                user_id, int(receiver_id), text, voice_url or None,
+                voice_duration if voice_url and voice_duration else None
+            ))
             message_id = cur.fetchone()[0]
             
-            # Обновляем last_activity отправителя
+            # Будим long-poll получателя (wait-messages); NOTIFY доставляется после COMMIT
             cur.execute(
-                "UPDATE t_p53416936_auxchat_energy_messa.users SET last_activity = CURRENT_TIMESTAMP WHERE id = %s",
-                (user_id,)
+                "SELECT pg_notify(%s, %s)",
+                (f'private_messages_{int(receiver_id)}', json.dumps({'messageId': message_id, 'senderId': user_id}))
             )
             
+            # Обновляем сводку диалога для get-conversations в той же транзакции
+            cur.execute("""
+                INSERT INTO t_p53416936_auxchat_energy_messa.conversations
+                    (user_low, user_high, last_message_id, last_message_text, last_message_at, unread_low, unread_high)
+                SELECT LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id), id, text, created_at,
+                       CASE WHEN receiver_id < sender_id THEN 1 ELSE 0 END,
+                       CASE WHEN receiver_id > sender_id THEN 1 ELSE 0 END
+                FROM t_p53416936_auxchat_energy_messa.private_messages
+                WHERE id = %s
+                ON CONFLICT (user_low, user_high) DO UPDATE SET
+                    last_message_id = GREATEST(conversations.last_message_id, EXCLUDED.last_message_id),
+                    last_message_text = CASE WHEN EXCLUDED.last_message_id > conversations.last_message_id
+                        THEN EXCLUDED.last_message_text ELSE conversations.last_message_text END,
+                    last_message_at = GREATEST(conversations.last_message_at, EXCLUDED.last_message_at),
+                    unread_low = conversations.unread_low + EXCLUDED.unread_low,
+                    unread_high = conversations.unread_high + EXCLUDED.unread_high
+            """, (message_id,))
+            
+            # Отмечаем активность отправителя в буфере присутствия
+            touch(cur, user_id)
+            
             conn.commit()
             cur.close()
-            conn.close()
+            put_conn(conn)
             
             return {
                 'statusCode': 200,
@@ -205,7 +289,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             }
         
         cur.close()
-        conn.close()
+        put_conn(conn)
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
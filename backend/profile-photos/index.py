@@ -5,9 +5,31 @@ Returns: HTTP response with photos list or operation status
 '''
 
 import json
-import os
-import psycopg2
 from typing import Dict, Any
+from _common.db import get_conn, put_conn
+from _common.auth import authenticate
+from _common.profiles import bump_version, load_profile
+from _common.queries import statement, execute
+
+COUNT_PHOTOS = statement('pp_count', ('integer',), """
+    SELECT COUNT(*) FROM t_p53416936_auxchat_energy_messa.user_photos WHERE user_id = $1
+""")
+
+INSERT_PHOTO = statement('pp_insert', ('integer', 'text'), """
+    INSERT INTO t_p53416936_auxchat_energy_messa.user_photos (user_id, photo_url) VALUES ($1, $2) RETURNING id
+""")
+
+DEMOTE_PHOTOS = statement('pp_demote', ('integer',), """
+    UPDATE t_p53416936_auxchat_energy_messa.user_photos SET display_order = 999 WHERE user_id = $1
+""")
+
+SET_MAIN_PHOTO = statement('pp_set_main', ('integer', 'integer'), """
+    UPDATE t_p53416936_auxchat_energy_messa.user_photos SET display_order = 0 WHERE id = $1 AND user_id = $2
+""")
+
+DELETE_PHOTO = statement('pp_delete', ('integer', 'integer'), """
+    DELETE FROM t_p53416936_auxchat_energy_messa.user_photos WHERE id = $1 AND user_id = $2
+""")
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -18,44 +40,34 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Session-Token, Authorization',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
         }
     
-    headers = event.get('headers', {})
-    user_id_str = headers.get('X-User-Id') or headers.get('x-user-id')
+    session = authenticate(event)
     
-    if not user_id_str:
+    if not session:
         return {
             'statusCode': 401,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': 'X-User-Id header required'})
         }
     
-    user_id = int(user_id_str)
-    dsn = os.environ.get('DATABASE_URL')
-    
-    conn = psycopg2.connect(dsn)
-    cur = conn.cursor()
+    user_id = session.user_id
     
     if method == 'GET':
-        query_params = event.get('queryStringParameters', {})
-        target_user_id = query_params.get('userId', user_id)
-        
-        cur.execute(
-            f"SELECT id, photo_url, created_at, display_order FROM t_p53416936_auxchat_energy_messa.user_photos WHERE user_id = {target_user_id} ORDER BY display_order ASC, created_at DESC LIMIT 6"
-        )
-        rows = cur.fetchall()
-        
-        photos = [
-            {'id': row[0], 'url': row[1], 'created_at': row[2].isoformat(), 'order': row[3]}
-            for row in rows
-        ]
+        query_params = event.get('queryStringParameters') or {}
+        target_user_id = int(query_params.get('userId', user_id))
         
+        # Без кеша: свежая загрузка должна сразу появиться в галерее, на каком бы экземпляре её ни запросили
+        conn = get_conn()
+        cur = conn.cursor()
+        profile = load_profile(cur, target_user_id)
         cur.close()
-        conn.close()
+        put_conn(conn)
+        photos = profile['photos'] if profile else []
         
         return {
             'statusCode': 200,
@@ -63,41 +75,40 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'photos': photos})
         }
     
+    conn = get_conn()
+    cur = conn.cursor()
+    
     if method == 'POST':
         body_data = json.loads(event.get('body', '{}'))
         photo_url = body_data.get('photoUrl', '').strip()
         
         if not photo_url:
             cur.close()
-            conn.close()
+            put_conn(conn)
             return {
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                 'body': json.dumps({'error': 'photoUrl required'})
             }
         
-        cur.execute(
-            f"SELECT COUNT(*) FROM t_p53416936_auxchat_energy_messa.user_photos WHERE user_id = {user_id}"
-        )
+        execute(cur, COUNT_PHOTOS, (user_id,))
         count = cur.fetchone()[0]
         
         if count >= 6:
             cur.close()
-            conn.close()
+            put_conn(conn)
             return {
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                 'body': json.dumps({'error': 'Maximum 6 photos allowed'})
             }
         
-        photo_url_escaped = photo_url.replace("'", "''")
-        cur.execute(
-            f"INSERT INTO t_p53416936_auxchat_energy_messa.user_photos (user_id, photo_url) VALUES ({user_id}, '{photo_url_escaped}') RETURNING id"
-        )
+        execute(cur, INSERT_PHOTO, (user_id, photo_url))
         photo_id = cur.fetchone()[0]
+        bump_version(cur, user_id)
         conn.commit()
         cur.close()
-        conn.close()
+        put_conn(conn)
         
         return {
             'statusCode': 200,
@@ -112,24 +123,21 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         if not photo_id or action != 'set_main':
             cur.close()
-            conn.close()
+            put_conn(conn)
             return {
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                 'body': json.dumps({'error': 'photoId and action=set_main required'})
             }
         
-        cur.execute(
-            f"UPDATE t_p53416936_auxchat_energy_messa.user_photos SET display_order = 999 WHERE user_id = {user_id}"
-        )
+        execute(cur, DEMOTE_PHOTOS, (user_id,))
         
-        cur.execute(
-            f"UPDATE t_p53416936_auxchat_energy_messa.user_photos SET display_order = 0 WHERE id = {photo_id} AND user_id = {user_id}"
-        )
+        execute(cur, SET_MAIN_PHOTO, (int(photo_id), user_id))
+        bump_version(cur, user_id)
         
         conn.commit()
         cur.close()
-        conn.close()
+        put_conn(conn)
         
         return {
             'statusCode': 200,
@@ -143,7 +151,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         if not photo_id_str:
             cur.close()
-            conn.close()
+            put_conn(conn)
             return {
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -152,13 +160,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         photo_id = int(photo_id_str)
         
-        cur.execute(
-            f"DELETE FROM t_p53416936_auxchat_energy_messa.user_photos WHERE id = {photo_id} AND user_id = {user_id}"
-        )
+        execute(cur, DELETE_PHOTO, (photo_id, user_id))
         affected = cur.rowcount
+        if affected:
+            bump_version(cur, user_id)
         conn.commit()
         cur.close()
-        conn.close()
+        put_conn(conn)
         
         if affected == 0:
             return {
@@ -174,7 +182,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     cur.close()
-    conn.close()
+    put_conn(conn)
     return {
         'statusCode': 405,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -1,8 +1,9 @@
 import json
-import os
-import psycopg2
-import hashlib
 from typing import Dict, Any
+from _common.db import get_conn, put_conn
+from _common.auth import issue_token
+from _common.energy import record_opening_balance
+from _common.passwords import hash_password
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -52,8 +53,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Password must be at least 6 characters'})
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = get_conn()
     cur = conn.cursor()
     
     cur.execute("SELECT id FROM t_p53416936_auxchat_energy_messa.users WHERE phone = %s", (phone,))
@@ -61,24 +61,25 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     if existing:
         cur.close()
-        conn.close()
+        put_conn(conn)
         return {
             'statusCode': 400,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': 'User already exists'})
         }
     
-    password_hash = hashlib.sha256(password.encode()).hexdigest()
+    password_hash = hash_password(password)
     
     cur.execute(
         "INSERT INTO t_p53416936_auxchat_energy_messa.users (phone, username, avatar_url, password_hash) VALUES (%s, %s, %s, %s) RETURNING id",
         (phone, username, avatar, password_hash)
     )
     user_id = cur.fetchone()[0]
+    record_opening_balance(cur, user_id)
     
     conn.commit()
     cur.close()
-    conn.close()
+    put_conn(conn)
     
     return {
         'statusCode': 200,
@@ -89,6 +90,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'username': username,
             'avatar': avatar,
             'energy': 100,
-            'is_admin': False
+            'is_admin': False,
+            'token': issue_token(user_id)
         })
     }
@@ -1,8 +1,7 @@
 import json
-import os
-import psycopg2
-import hashlib
 from typing import Dict, Any
+from _common.db import get_conn, put_conn
+from _common.passwords import hash_password
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -50,8 +49,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Password must be at least 6 characters'})
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = get_conn()
     cur = conn.cursor()
     
     cur.execute("SELECT id FROM t_p53416936_auxchat_energy_messa.users WHERE phone = %s", (phone,))
@@ -59,7 +57,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     if not result:
         cur.close()
-        conn.close()
+        put_conn(conn)
         return {
             'statusCode': 404,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -67,7 +65,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     user_id = result[0]
-    password_hash = hashlib.sha256(new_password.encode()).hexdigest()
+    password_hash = hash_password(new_password)
     
     cur.execute(
         "UPDATE t_p53416936_auxchat_energy_messa.users SET password_hash = %s WHERE id = %s",
@@ -76,7 +74,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     conn.commit()
     cur.close()
-    conn.close()
+    put_conn(conn)
     
     return {
         'statusCode': 200,
@@ -1,12 +1,17 @@
 import json
-import os
-import psycopg2
 from typing import Dict, Any
+from _common.db import get_conn, put_conn
+from _common.auth import ACCEPT_USER_ID_HEADER, authenticate, token_from
+from _common.energy import BALANCE_SQL, debit_lock_sql, materialize_if_due
+from _common.ratelimit import get_limiter, too_many_requests
+from _common.feed import fan_out
+
+MESSAGE_COST = 10
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Send chat message and deduct energy
-    Args: event with httpMethod, body (user_id, text)
+    Args: event with httpMethod, headers (X-Session-Token), body (text; user_id without a token)
           context with request_id
     Returns: HTTP response with message data
     '''
@@ -18,7 +23,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Session-Token, Authorization',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -32,9 +37,27 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     body_data = json.loads(event.get('body', '{}'))
-    user_id = body_data.get('user_id')
     text = body_data.get('text', '').strip()
     
+    session = authenticate(event)
+    if session and session.signed:
+        if session.is_banned:
+            return {
+                'statusCode': 403,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'User is banned'})
+            }
+        user_id = session.user_id
+    elif ACCEPT_USER_ID_HEADER and not token_from(event):
+        # user_id из тела — только для старых клиентов без токена; невалидный токен — это 401
+        user_id = body_data.get('user_id')
+    else:
+        return {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Unauthorized'})
+        }
+    
     if not user_id or not text:
         return {
             'statusCode': 400,
@@ -49,57 +72,76 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Сообщение не должно превышать 140 символов'})
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
-    cur = conn.cursor()
-    
-    cur.execute("SELECT energy, is_banned FROM t_p53416936_auxchat_energy_messa.users WHERE id = %s", (user_id,))
-    user_data = cur.fetchone()
-    
-    if not user_data:
-        cur.close()
-        conn.close()
-        return {
-            'statusCode': 404,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'User not found'})
-        }
+    allowed, retry_after = get_limiter().allow('send-message:user', user_id)
+    if not allowed:
+        return too_many_requests(retry_after)
     
-    energy = user_data[0]
-    is_banned = user_data[1] if len(user_data) > 1 and user_data[1] is not None else False
+    conn = get_conn()
+    cur = conn.cursor()
     
-    if is_banned:
-        cur.close()
-        conn.close()
-        return {
-            'statusCode': 403,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'User is banned'})
-        }
+    # Списание — это запись в журнал energy_ledger, строка users не блокируется.
+    # Advisory-lock сериализует проверки баланса одного пользователя: следующий
+    # оператор берёт свежий снимок и видит списания параллельных отправок
+    cur.execute(debit_lock_sql() + f"""
+        WITH account AS (
+            SELECT u.id, {BALANCE_SQL} AS balance
+            FROM t_p53416936_auxchat_energy_messa.users u
+            WHERE u.id = %s AND u.is_banned IS NOT TRUE
+        ),
+        debit AS (
+            INSERT INTO t_p53416936_auxchat_energy_messa.energy_ledger (user_id, amount, reason)
+            SELECT id, -%s, 'message' FROM account WHERE balance >= %s
+            RETURNING user_id
+        ),
+        inserted AS (
+            INSERT INTO t_p53416936_auxchat_energy_messa.messages (user_id, text)
+            SELECT user_id, %s FROM debit
+            RETURNING id, created_at
+        ),
+        seen AS (
+            INSERT INTO t_p53416936_auxchat_energy_messa.user_presence (user_id, last_seen)
+            SELECT user_id, CURRENT_TIMESTAMP FROM debit
+            ON CONFLICT (user_id) DO UPDATE SET last_seen = EXCLUDED.last_seen
+        )
+        SELECT inserted.id, inserted.created_at, account.balance - %s FROM inserted, account
+    """, (user_id, user_id, MESSAGE_COST, MESSAGE_COST, text, MESSAGE_COST))
+    result = cur.fetchone()
     
-    if energy < 10:
+    if not result:
+        # Медленный путь только для отказа: выясняем причину. Токен мог пережить
+        # удаление пользователя или бан, поэтому причину проверяем и для подписанных сессий
+        cur.execute("SELECT is_banned FROM t_p53416936_auxchat_energy_messa.users WHERE id = %s", (user_id,))
+        user_data = cur.fetchone()
         cur.close()
-        conn.close()
+        put_conn(conn)
+        
+        if not user_data:
+            return {
+                'statusCode': 404,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'User not found'})
+            }
+        
+        if user_data[0]:
+            return {
+                'statusCode': 403,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'User is banned'})
+            }
+        
         return {
             'statusCode': 402,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': 'Недостаточно энергии для отправки сообщения'})
         }
     
-    cur.execute(
-        "UPDATE t_p53416936_auxchat_energy_messa.users SET energy = energy - 10, last_activity = CURRENT_TIMESTAMP WHERE id = %s", 
-        (user_id,)
-    )
-    
-    cur.execute(
-        "INSERT INTO t_p53416936_auxchat_energy_messa.messages (user_id, text) VALUES (%s, %s) RETURNING id, created_at",
-        (user_id, text)
-    )
-    message_id, created_at = cur.fetchone()
+    message_id, created_at, energy = result
+    fan_out(cur, user_id, message_id)
     
     conn.commit()
     cur.close()
-    conn.close()
+    materialize_if_due(conn)
+    put_conn(conn)
     
     return {
         'statusCode': 200,
@@ -109,6 +151,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'user_id': user_id,
             'text': text,
             'created_at': created_at.isoformat(),
-            'energy': energy - 10
+            'energy': energy
         })
     }
\ No newline at end of file
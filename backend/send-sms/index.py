@@ -1,11 +1,10 @@
 import json
-import os
 import random
-import psycopg2
 from typing import Dict, Any
 from datetime import datetime, timedelta
-import urllib.request
-import urllib.parse
+from _common.db import get_conn, put_conn
+from _common.sms import enqueue
+from _common.ratelimit import client_ip, get_limiter, too_many_requests
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -35,14 +34,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Method not allowed'})
         }
     
-    api_key = os.environ.get('SMSRU_API_KEY')
-    if not api_key:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'SMS API not configured'})
-        }
-    
     body_data = json.loads(event.get('body', '{}'))
     phone = body_data.get('phone', '').strip()
     
@@ -53,6 +44,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Phone number required'})
         }
     
+    # Каждое прошедшее сюда обращение — платная SMS, поэтому лимит и на номер, и на IP
+    limiter = get_limiter()
+    for policy, identity in (('send-sms:phone', phone), ('send-sms:ip', client_ip(event))):
+        allowed, retry_after = limiter.allow(policy, identity)
+        if not allowed:
+            return too_many_requests(retry_after)
+    
     # Тестовый режим для разработки
     if phone == '+79999999999':
         code = '1234'
@@ -60,61 +58,33 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         code = str(random.randint(1000, 9999))
     
     # Сохраняем в БД
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = get_conn()
     cur = conn.cursor()
     
-    # Удаляем старые коды для этого телефона
-    cur.execute("DELETE FROM sms_codes WHERE phone = %s", (phone,))
-    
-    # Создаем новый код (действителен 10 минут)
+    # Новый код (действителен 10 минут) заменяет прежний код этого телефона
     expires_at = datetime.now() + timedelta(minutes=10)
     cur.execute(
-        "INSERT INTO sms_codes (phone, code, expires_at) VALUES (%s, %s, %s)",
+        """
+        INSERT INTO sms_codes (phone, code, expires_at) VALUES (%s, %s, %s)
+        ON CONFLICT (phone) DO UPDATE SET
+            code = EXCLUDED.code,
+            expires_at = EXCLUDED.expires_at,
+            created_at = CURRENT_TIMESTAMP,
+            verified = FALSE
+        """,
         (phone, code, expires_at)
     )
+    
+    # Отправку берёт на себя sms-worker: ответ не ждёт sms.ru
+    enqueue(cur, phone, f"Ваш код для входа в AuxChat: {code}")
     conn.commit()
+    cur.close()
+    put_conn(conn)
     
-    # Отправляем SMS через SMS.RU
-    message = f"Ваш код для входа в AuxChat: {code}"
-    params = urllib.parse.urlencode({
-        'api_id': api_key,
-        'to': phone,
-        'msg': message,
-        'json': 1
-    })
+    print(f"Test code for {phone}: {code}")
     
-    try:
-        url = f'https://sms.ru/sms/send?{params}'
-        req = urllib.request.Request(url)
-        response = urllib.request.urlopen(req)
-        result = json.loads(response.read().decode('utf-8'))
-        
-        print(f"SMS.RU response: {result}")
-        print(f"Test code for {phone}: {code}")
-        
-        cur.close()
-        conn.close()
-        
-        if result.get('status') == 'OK' or result.get('status_code') == 100:
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True, 'message': 'SMS sent'})
-            }
-        else:
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True, 'message': 'SMS sent'})
-            }
-    except Exception as e:
-        print(f"SMS sending error: {e}")
-        print(f"Test code for {phone}: {code}")
-        cur.close()
-        conn.close()
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'success': True, 'message': 'SMS sent'})
-        }
\ No newline at end of file
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'success': True, 'message': 'SMS sent'})
+    }
@@ -0,0 +1,71 @@
+'''
+Business: Drain the SMS outbox - sends queued verification codes in concurrent batches with retries, then sweeps expired codes
+Args: event with httpMethod (timer trigger or POST); SMS_PROVIDER, SMSRU_API_KEY, SMS_WORKER_* settings from environment
+Returns: HTTP response with claimed/sent/retried/failed counters and rows removed by the sweeper
+'''
+
+import json
+import os
+import time
+from typing import Dict, Any
+from _common.db import get_conn, put_conn
+from _common.sms import SmsError, drain, fitting_batch, get_provider, sweep
+from _common.ratelimit import get_limiter
+
+# Сколько секунд одного вызова тратить на очередь, чтобы уложиться в таймаут функции
+TIME_BUDGET = float(os.environ.get('SMS_WORKER_TIME_BUDGET', '20'))
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'POST')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+    
+    try:
+        provider = get_provider()
+    except SmsError as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)})
+        }
+    
+    totals = {'claimed': 0, 'sent': 0, 'retried': 0, 'failed': 0}
+    deadline = time.monotonic() + TIME_BUDGET
+    
+    conn = get_conn()
+    while True:
+        # Берём не больше, чем успеет уйти до дедлайна даже при таймаутах провайдера;
+        # иначе аренда пачки переживёт вызов и недоотправленное подхватит следующий запуск
+        batch_size = fitting_batch(deadline - time.monotonic())
+        if batch_size <= 0:
+            break
+        stats = drain(conn, provider, batch_size=batch_size)
+        for key in totals:
+            totals[key] += stats[key]
+        if stats['claimed'] == 0:
+            break
+    
+    # Уборка после отправки: просроченные коды, старые записи очереди и полные вёдра лимитера
+    swept = sweep(conn)
+    put_conn(conn)
+    swept['rate_limits'] = get_limiter().sweep()
+    totals['swept'] = swept
+    
+    print(f'SMS outbox: {totals}')
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'isBase64Encoded': False,
+        'body': json.dumps(totals)
+    }
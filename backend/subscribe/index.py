@@ -5,8 +5,10 @@ Returns: HTTP response with subscription status
 '''
 
 import json
-import os
 from typing import Dict, Any
+from _common.db import get_conn, put_conn
+from _common.auth import authenticate
+from _common.feed import backfill, drop_author
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -18,27 +20,24 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Session-Token, Authorization',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
         }
     
-    headers = event.get('headers', {})
-    user_id_str = headers.get('X-User-Id') or headers.get('x-user-id')
+    session = authenticate(event)
     
-    if not user_id_str:
+    if not session:
         return {
             'statusCode': 401,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': 'Unauthorized'})
         }
     
-    user_id = int(user_id_str)
+    user_id = session.user_id
     
-    import psycopg2
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = get_conn()
     conn.autocommit = True
     cur = conn.cursor()
     
@@ -92,6 +91,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 VALUES (%s, %s)
                 ON CONFLICT (subscriber_id, subscribed_to_id) DO NOTHING
             ''', (user_id, int(target_user_id)))
+            backfill(cur, user_id, int(target_user_id))
             
             return {
                 'statusCode': 200,
@@ -115,6 +115,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 DELETE FROM t_p53416936_auxchat_energy_messa.subscriptions
                 WHERE subscriber_id = %s AND subscribed_to_id = %s
             ''', (user_id, int(target_user_id)))
+            drop_author(cur, user_id, int(target_user_id))
             
             return {
                 'statusCode': 200,
@@ -131,4 +132,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     finally:
         cur.close()
-        conn.close()
+        put_conn(conn)
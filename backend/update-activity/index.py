@@ -5,9 +5,10 @@ Returns: HTTP response with success status
 '''
 
 import json
-import os
-import psycopg2
 from typing import Dict, Any
+from _common.db import get_conn, put_conn
+from _common.presence import touch, flush_if_due
+from _common.auth import authenticate
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'POST')
@@ -18,7 +19,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Session-Token, Authorization',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -33,10 +34,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    headers = event.get('headers', {})
-    user_id_str = headers.get('X-User-Id') or headers.get('x-user-id')
+    session = authenticate(event)
     
-    if not user_id_str:
+    if not session:
         return {
             'statusCode': 401,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -44,20 +44,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    user_id = int(user_id_str)
-    dsn = os.environ.get('DATABASE_URL')
+    user_id = session.user_id
     
-    conn = psycopg2.connect(dsn)
+    conn = get_conn()
     cur = conn.cursor()
     
-    cur.execute(
-        "UPDATE t_p53416936_auxchat_energy_messa.users SET last_activity = CURRENT_TIMESTAMP WHERE id = %s",
-        (user_id,)
-    )
+    touch(cur, user_id)
     
     conn.commit()
     cur.close()
-    conn.close()
+    flush_if_due(conn)
+    put_conn(conn)
     
     return {
         'statusCode': 200,
@@ -1,8 +1,8 @@
 import json
-import os
-import psycopg2
 from typing import Dict, Any
 from datetime import datetime
+from _common.db import get_conn, put_conn
+from _common.auth import issue_token
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -43,20 +43,19 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Phone and code required'})
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = get_conn()
     cur = conn.cursor()
     
     # Ищем код в БД
     cur.execute(
-        "SELECT id, code, expires_at, verified FROM sms_codes WHERE phone = %s ORDER BY created_at DESC LIMIT 1",
+        "SELECT id, code, expires_at, verified FROM sms_codes WHERE phone = %s",
         (phone,)
     )
     result = cur.fetchone()
     
     if not result:
         cur.close()
-        conn.close()
+        put_conn(conn)
         return {
             'statusCode': 400,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -68,7 +67,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     # Проверяем код
     if verified:
         cur.close()
-        conn.close()
+        put_conn(conn)
         return {
             'statusCode': 400,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -77,7 +76,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     if datetime.now() > expires_at:
         cur.close()
-        conn.close()
+        put_conn(conn)
         return {
             'statusCode': 400,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -86,7 +85,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     if code != db_code:
         cur.close()
-        conn.close()
+        put_conn(conn)
         return {
             'statusCode': 400,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -97,19 +96,21 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     cur.execute("UPDATE sms_codes SET verified = TRUE WHERE id = %s", (code_id,))
     
     # Проверяем, есть ли пользователь с таким телефоном
-    cur.execute("SELECT id FROM t_p53416936_auxchat_energy_messa.users WHERE phone = %s", (phone,))
+    cur.execute("SELECT id, is_admin, is_banned FROM t_p53416936_auxchat_energy_messa.users WHERE phone = %s", (phone,))
     user_row = cur.fetchone()
     
     user_id = None
+    token = None
     if user_row:
         user_id = user_row[0]
+        token = issue_token(user_id, user_row[1], user_row[2])
     
     conn.commit()
     cur.close()
-    conn.close()
+    put_conn(conn)
     
     return {
         'statusCode': 200,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'success': True, 'phone': phone, 'user_id': user_id, 'is_new': user_id is None})
+        'body': json.dumps({'success': True, 'phone': phone, 'user_id': user_id, 'is_new': user_id is None, 'token': token})
     }
\ No newline at end of file
@@ -0,0 +1,136 @@
+'''
+Business: Long-poll for new private messages via PostgreSQL LISTEN/NOTIFY
+Args: event with httpMethod, headers (X-User-Id), query params (sinceId required, 0 means from now; timeout)
+Returns: HTTP response with new message events as soon as they arrive or empty list on timeout
+'''
+
+import json
+import math
+import time
+from typing import Dict, Any
+from _common.db import get_conn, put_conn
+from _common.auth import authenticate
+from _common.listener import ListenerUnavailable, get_listener
+
+MAX_WAIT_SECONDS = 25
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Session-Token, Authorization',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+    
+    session = authenticate(event)
+    
+    if not session:
+        return {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'X-User-Id header required'}),
+            'isBase64Encoded': False
+        }
+    
+    user_id = session.user_id
+    query_params = event.get('queryStringParameters') or {}
+    
+    # Без sinceId уже прочитанные сообщения отдавались бы сразу, и long-poll превращался в частый опрос
+    if not query_params.get('sinceId'):
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'sinceId required'}),
+            'isBase64Encoded': False
+        }
+    
+    try:
+        since_id = int(query_params['sinceId'])
+        timeout = float(query_params.get('timeout', MAX_WAIT_SECONDS))
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'sinceId must be an integer and timeout a number'}),
+            'isBase64Encoded': False
+        }
+    
+    # NaN проходит через min/max без изменений, а inf превращался бы в максимум
+    if not math.isfinite(timeout):
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'timeout must be a finite number'}),
+            'isBase64Encoded': False
+        }
+    timeout = min(max(timeout, 1), MAX_WAIT_SECONDS)
+    
+    # Ожидающий запрос не держит соединение пула: LISTEN выполняет одно общее соединение экземпляра.
+    # Канал совпадает с тем, в который private-messages делает pg_notify при отправке
+    try:
+        waiter = get_listener().subscribe(f'private_messages_{user_id}')
+    except ListenerUnavailable as e:
+        return {
+            'statusCode': 503,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Retry-After': '1'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    
+    events = []
+    try:
+        # Сообщения, пришедшие между прошлым опросом клиента и LISTEN, отдаём сразу.
+        # sinceId=0 - клиент только открыл чат и историю берёт из private-messages: ждём новые
+        if since_id > 0:
+            conn = get_conn()
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT id, sender_id FROM t_p53416936_auxchat_energy_messa.private_messages
+                WHERE receiver_id = %s AND id > %s
+                ORDER BY id ASC
+                LIMIT 100
+                """,
+                (user_id, since_id)
+            )
+            events = [{'messageId': row[0], 'senderId': row[1]} for row in cur.fetchall()]
+            cur.close()
+            put_conn(conn)
+        
+        deadline = time.monotonic() + timeout
+        while not events:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            payloads = waiter.wait(remaining)
+            if not payloads:
+                break
+            for payload in payloads:
+                message = json.loads(payload)
+                if message['messageId'] > since_id:
+                    events.append(message)
+    finally:
+        get_listener().unsubscribe(waiter)
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'events': events, 'timedOut': not events}),
+        'isBase64Encoded': False
+    }
@@ -0,0 +1,2 @@
+-- Составной индекс для keyset-пагинации ленты по (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_messages_created_at_id ON t_p53416936_auxchat_energy_messa.messages(created_at DESC, id DESC);
@@ -0,0 +1,38 @@
+-- Сводная таблица диалогов: одна строка на пару пользователей (user_low < user_high).
+-- Поддерживается private-messages при отправке и прочтении, get-conversations читает только её.
+CREATE TABLE IF NOT EXISTS t_p53416936_auxchat_energy_messa.conversations (
+    user_low INTEGER NOT NULL,
+    user_high INTEGER NOT NULL,
+    last_message_id INTEGER NOT NULL,
+    last_message_text TEXT NOT NULL,
+    last_message_at TIMESTAMP NOT NULL,
+    unread_low INTEGER NOT NULL DEFAULT 0,
+    unread_high INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_low, user_high)
+);
+
+CREATE INDEX IF NOT EXISTS idx_conversations_low_last ON t_p53416936_auxchat_energy_messa.conversations(user_low, last_message_at DESC);
+CREATE INDEX IF NOT EXISTS idx_conversations_high_last ON t_p53416936_auxchat_energy_messa.conversations(user_high, last_message_at DESC);
+
+-- Заполняем по уже существующим личным сообщениям
+INSERT INTO t_p53416936_auxchat_energy_messa.conversations
+    (user_low, user_high, last_message_id, last_message_text, last_message_at, unread_low, unread_high)
+SELECT lm.user_low, lm.user_high, lm.id, lm.text, lm.created_at, uc.unread_low, uc.unread_high
+FROM (
+    SELECT DISTINCT ON (LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id))
+        LEAST(sender_id, receiver_id) AS user_low,
+        GREATEST(sender_id, receiver_id) AS user_high,
+        id, text, created_at
+    FROM t_p53416936_auxchat_energy_messa.private_messages
+    ORDER BY LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id), created_at DESC, id DESC
+) lm
+JOIN (
+    SELECT
+        LEAST(sender_id, receiver_id) AS user_low,
+        GREATEST(sender_id, receiver_id) AS user_high,
+        COUNT(*) FILTER (WHERE is_read = FALSE AND receiver_id = LEAST(sender_id, receiver_id)) AS unread_low,
+        COUNT(*) FILTER (WHERE is_read = FALSE AND receiver_id = GREATEST(sender_id, receiver_id)) AS unread_high
+    FROM t_p53416936_auxchat_energy_messa.private_messages
+    GROUP BY LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id)
+) uc ON uc.user_low = lm.user_low AND uc.user_high = lm.user_high
+ON CONFLICT (user_low, user_high) DO NOTHING;
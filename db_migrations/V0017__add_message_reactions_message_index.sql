@@ -0,0 +1,2 @@
+-- Индекс для выборки реакций по сообщению (get-messages, add-reaction)
+CREATE INDEX IF NOT EXISTS idx_message_reactions_message_id ON t_p53416936_auxchat_energy_messa.message_reactions(message_id);
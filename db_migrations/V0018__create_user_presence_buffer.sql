@@ -0,0 +1,6 @@
+-- Буфер присутствия: частые heartbeat-обновления пишутся сюда, а не в users.
+-- Таблица UNLOGGED (без WAL); при потере данных после сбоя остаётся users.last_activity.
+CREATE UNLOGGED TABLE IF NOT EXISTS t_p53416936_auxchat_energy_messa.user_presence (
+    user_id INTEGER PRIMARY KEY,
+    last_seen TIMESTAMP NOT NULL
+);
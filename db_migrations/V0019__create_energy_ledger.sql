@@ -0,0 +1,20 @@
+-- Журнал изменений энергии: обработчики только добавляют записи, а users.energy
+-- хранит материализованный баланс. Баланс пользователя = users.energy + сумма
+-- ещё не материализованных записей журнала.
+CREATE TABLE IF NOT EXISTS t_p53416936_auxchat_energy_messa.energy_ledger (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    reason VARCHAR(32) NOT NULL,
+    reference TEXT,
+    materialized BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_energy_ledger_pending ON t_p53416936_auxchat_energy_messa.energy_ledger(user_id) WHERE materialized = FALSE;
+CREATE INDEX IF NOT EXISTS idx_energy_ledger_user_created ON t_p53416936_auxchat_energy_messa.energy_ledger(user_id, created_at DESC);
+
+-- Входящий остаток для существующих пользователей, чтобы сумма журнала совпадала с балансом
+INSERT INTO t_p53416936_auxchat_energy_messa.energy_ledger (user_id, amount, reason, materialized)
+SELECT id, COALESCE(energy, 0), 'opening_balance', TRUE
+FROM t_p53416936_auxchat_energy_messa.users;
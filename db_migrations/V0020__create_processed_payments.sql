@@ -0,0 +1,7 @@
+-- Обработанные платежи YooKassa: повторная доставка webhook не начисляет энергию второй раз
+CREATE TABLE IF NOT EXISTS t_p53416936_auxchat_energy_messa.processed_payments (
+    payment_id VARCHAR(64) PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    energy_amount INTEGER NOT NULL,
+    processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
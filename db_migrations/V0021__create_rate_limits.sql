@@ -0,0 +1,9 @@
+-- Token bucket для ограничения частоты запросов. UNLOGGED: после сбоя вёдра
+-- просто начинаются заново полными, WAL на каждый запрос не пишется
+CREATE UNLOGGED TABLE IF NOT EXISTS t_p53416936_auxchat_energy_messa.rate_limits (
+    bucket VARCHAR(128) PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_rate_limits_updated_at ON t_p53416936_auxchat_energy_messa.rate_limits(updated_at);
@@ -0,0 +1,15 @@
+-- Очередь исходящих SMS: send-sms только добавляет запись, отправкой занимается sms-worker.
+-- next_attempt_at служит и временем следующей попытки, и арендой захваченной записи
+CREATE TABLE IF NOT EXISTS t_p53416936_auxchat_energy_messa.sms_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    phone VARCHAR(20) NOT NULL,
+    message TEXT NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_sms_outbox_pending ON t_p53416936_auxchat_energy_messa.sms_outbox(next_attempt_at) WHERE status = 'pending';
@@ -0,0 +1,11 @@
+-- Один актуальный код на телефон: send-sms делает upsert вместо DELETE + INSERT,
+-- а verify-sms читает код по уникальному индексу без сортировки
+DELETE FROM sms_codes s
+USING sms_codes newer
+WHERE newer.phone = s.phone
+  AND (newer.created_at > s.created_at OR (newer.created_at = s.created_at AND newer.id > s.id));
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_sms_codes_phone_unique ON sms_codes(phone);
+
+-- Уникальный индекс полностью заменяет обычный индекс по телефону
+DROP INDEX IF EXISTS idx_sms_codes_phone;
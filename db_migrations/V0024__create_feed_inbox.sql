@@ -0,0 +1,14 @@
+-- Лента подписок: последние сообщения каждого автора читаются по индексу
+CREATE INDEX IF NOT EXISTS idx_messages_user_created_at_id ON t_p53416936_auxchat_energy_messa.messages(user_id, created_at DESC, id DESC);
+
+-- Входящие ленты для fan-out-on-write (FEED_FANOUT_ON_WRITE=1): send-message копирует
+-- ссылку на новое сообщение каждому подписчику автора
+CREATE TABLE IF NOT EXISTS t_p53416936_auxchat_energy_messa.feed_inbox (
+    subscriber_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (subscriber_id, message_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_feed_inbox_subscriber_created ON t_p53416936_auxchat_energy_messa.feed_inbox(subscriber_id, created_at DESC, message_id DESC);
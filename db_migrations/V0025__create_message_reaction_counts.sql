@@ -0,0 +1,22 @@
+-- Одна реакция каждого вида от пользователя на сообщение: убираем дубли перед уникальным индексом
+DELETE FROM message_reactions r
+USING message_reactions older
+WHERE older.message_id = r.message_id AND older.user_id = r.user_id AND older.emoji = r.emoji
+  AND older.id < r.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_message_reactions_unique ON message_reactions(message_id, user_id, emoji);
+
+-- Счётчики реакций, которые add-reaction обновляет в той же команде, что и message_reactions
+CREATE TABLE IF NOT EXISTS t_p53416936_auxchat_energy_messa.message_reaction_counts (
+    message_id INTEGER NOT NULL,
+    emoji VARCHAR(10) NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (message_id, emoji)
+);
+
+INSERT INTO t_p53416936_auxchat_energy_messa.message_reaction_counts (message_id, emoji, count)
+SELECT message_id, emoji, COUNT(*)
+FROM message_reactions
+WHERE message_id IS NOT NULL
+GROUP BY message_id, emoji
+ON CONFLICT (message_id, emoji) DO UPDATE SET count = EXCLUDED.count;
@@ -0,0 +1,25 @@
+-- Аудит индексов горячих запросов (проверка: backend/_tools/explain_hot_paths.py)
+
+-- Переписка пары в private-messages: обе ветки OR читаются по (sender_id, receiver_id)
+-- уже в порядке created_at; id в конце индекса отсекает sinceId без обращения к таблице
+CREATE INDEX IF NOT EXISTS idx_private_messages_pair_created_at ON t_p53416936_auxchat_energy_messa.private_messages(sender_id, receiver_id, created_at, id);
+
+-- Старые индексы — префиксы нового, они только замедляют вставку сообщений
+DROP INDEX IF EXISTS t_p53416936_auxchat_energy_messa.idx_private_messages_conversation;
+DROP INDEX IF EXISTS t_p53416936_auxchat_energy_messa.idx_private_messages_sender;
+
+-- Непрочитанные: отметка прочтения ищет receiver_id = X AND sender_id = Y AND is_read = FALSE,
+-- а прочитанные сообщения (почти все) в частичный индекс не попадают
+CREATE INDEX IF NOT EXISTS idx_private_messages_unread ON t_p53416936_auxchat_energy_messa.private_messages(receiver_id, sender_id, id) WHERE is_read = FALSE;
+
+-- Галерея профиля отдаётся в порядке display_order, created_at DESC — сортировка не нужна
+CREATE INDEX IF NOT EXISTS idx_user_photos_user_order ON t_p53416936_auxchat_energy_messa.user_photos(user_id, display_order, created_at DESC);
+
+DROP INDEX IF EXISTS t_p53416936_auxchat_energy_messa.idx_user_photos_user_id;
+
+-- Вход, регистрация, verify-sms и сброс пароля ищут пользователя по телефону
+CREATE INDEX IF NOT EXISTS idx_users_phone ON t_p53416936_auxchat_energy_messa.users(phone);
+
+-- Проверка блокировки в обе стороны уже идёт по UNIQUE(user_id, blocked_user_id):
+-- каждая ветка OR — точечный поиск по нему. Индекс по одному user_id — его префикс
+DROP INDEX IF EXISTS idx_blacklist_user_id;
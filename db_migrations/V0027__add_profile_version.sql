@@ -0,0 +1,3 @@
+-- Версия профиля: растёт при каждом изменении полей профиля или галереи.
+-- Кешированный профиль get-user сверяет с ней, поэтому правка видна во всех экземплярах сразу
+ALTER TABLE t_p53416936_auxchat_energy_messa.users ADD COLUMN IF NOT EXISTS profile_version INTEGER NOT NULL DEFAULT 0;
@@ -0,0 +1,7 @@
+-- Подписчики, чей feed_inbox заполнен по всем подпискам: только их get-feed читает из inbox.
+-- Подписки, созданные до включения FEED_FANOUT_ON_WRITE, в inbox не попадали; отметку ставит
+-- _tools/backfill_feed_inbox.py после переноса, а subscribe - при первой подписке пользователя
+CREATE TABLE IF NOT EXISTS t_p53416936_auxchat_energy_messa.feed_inbox_ready (
+    subscriber_id INTEGER PRIMARY KEY,
+    backfilled_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -43,7 +43,7 @@ export default function Chat() {
   const [currentUserProfile, setCurrentUserProfile] = useState<UserProfile | null>(null);
   const [loading, setLoading] = useState(true);
   const messagesEndRef = useRef<HTMLDivElement>(null);
-  const lastMessageCountRef = useRef(0);
+  const lastMessageIdRef = useRef(0);
   const [isBlocked, setIsBlocked] = useState(false);
   const [checkingBlock, setCheckingBlock] = useState(false);
   const [menuOpen, setMenuOpen] = useState(false);
@@ -69,6 +69,8 @@ export default function Chat() {
   };
 
   useEffect(() => {
+    lastMessageIdRef.current = 0;
+    setMessages([]);
     updateActivity();
     loadProfile();
     loadCurrentUserProfile();
@@ -161,8 +163,10 @@ export default function Chat() {
 
   const loadMessages = async () => {
     try {
+      // После первой загрузки запрашиваем только сообщения новее последнего полученного
+      const sinceId = lastMessageIdRef.current;
       const response = await fetch(
-        `https://functions.poehali.dev/0222e582-5c06-4780-85fa-c9145e5bba14?otherUserId=${userId}`,
+        `https://functions.poehali.dev/0222e582-5c06-4780-85fa-c9145e5bba14?otherUserId=${userId}${sinceId ? `&sinceId=${sinceId}` : ''}`,
         {
           headers: {
             'X-User-Id': currentUserId || '0'
@@ -170,25 +174,40 @@ export default function Chat() {
         }
       );
       const data = await response.json();
-      const newMessages = data.messages || [];
+      const newMessages: Message[] = data.messages || [];
       
-      // Инициализируем счётчик при первой загрузке
-      if (lastMessageCountRef.current === 0) {
-        lastMessageCountRef.current = newMessages.length;
-      } else if (newMessages.length > lastMessageCountRef.current) {
-        // Проверяем новые входящие сообщения
-        const latestMessage = newMessages[newMessages.length - 1];
-        // Если последнее сообщение от собеседника (не от нас)
-        if (String(latestMessage.senderId) !== String(currentUserId)) {
-          playNotificationSound();
-          toast.info(`Новое сообщение от ${profile?.username || 'пользователя'}`, {
-            description: latestMessage.text.slice(0, 50) + (latestMessage.text.length > 50 ? '...' : '')
-          });
-        }
-        lastMessageCountRef.current = newMessages.length;
+      if (newMessages.length > 0) {
+        lastMessageIdRef.current = Math.max(lastMessageIdRef.current, newMessages[newMessages.length - 1].id);
+      }
+      
+      if (!sinceId) {
+        setMessages(newMessages);
+        return;
       }
       
-      setMessages(newMessages);
+      // Проверяем новые входящие сообщения
+      const latestMessage = newMessages[newMessages.length - 1];
+      // Если последнее сообщение от собеседника (не от нас)
+      if (latestMessage && String(latestMessage.senderId) !== String(currentUserId)) {
+        playNotificationSound();
+        toast.info(`Новое сообщение от ${profile?.username || 'пользователя'}`, {
+          description: latestMessage.text.slice(0, 50) + (latestMessage.text.length > 50 ? '...' : '')
+        });
+      }
+      
+      const readUpToId: number | null = data.readUpToId ?? null;
+      setMessages((prev) => {
+        const knownIds = new Set(prev.map((m) => m.id));
+        const merged = [...prev, ...newMessages.filter((m) => !knownIds.has(m.id))];
+        if (readUpToId === null) {
+          return merged;
+        }
+        return merged.map((m) =>
+          !m.isRead && String(m.senderId) === String(currentUserId) && m.id <= readUpToId
+            ? { ...m, isRead: true }
+            : m
+        );
+      });
     } catch (error) {
       console.error('Error loading messages:', error);
     } finally {